@@ -0,0 +1,79 @@
+"""
+browser_profile_benchmark.py - A benchmark of the page loads saved by the browser profiles of the TestController.
+
+Loads each URL for every type of test, the way the controller used to, in a Chrome launched with only --headless and the
+normal page load strategy, and then with the Chrome flags, page load strategy and browser profile the controller uses for
+that type of test now. The browser cache is cleared before every load, so each one downloads the whole page. Only the
+navigation is measured, not the checks the tests make on the page.
+
+Usage: python benchmarks/browser_profile_benchmark.py url [url ...]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selenium import webdriver
+
+from pages.page import BasePage
+from test_suites.registry import get_registered_tests
+from test_suites.test_controller import TestController
+from utils.browser_utils import BROWSER_PROFILES, FULL_PROFILE
+
+REPEATS = 3  # The number of times each URL is loaded for each type of test
+
+
+def load_page(controller: TestController, url: str) -> float:
+    """ Return the number of seconds <controller> takes to load <url> with its active profile and an empty browser cache. """
+    controller.clear_navigation_cache()
+    controller.driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    page = BasePage(controller.driver, url)
+    start_time = time.perf_counter()
+    page.load()
+    return time.perf_counter() - start_time
+
+
+def create_legacy_controller() -> TestController:
+    """ Return a TestController whose driver is launched the way it was before the browser profiles, blocking nothing. """
+    controller = TestController.__new__(TestController)
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    controller.driver = webdriver.Chrome(options=options)
+    controller.driver.execute_cdp_cmd("Network.enable", {})
+    controller.returns_before_load = False
+    controller.active_profile = None
+    return controller
+
+
+def main() -> None:
+    urls = sys.argv[1:]
+    if not urls:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(2)
+    legacy_controller = create_legacy_controller()
+    controller = TestController()
+    try:
+        legacy_controller.apply_profile(BROWSER_PROFILES[FULL_PROFILE])
+        print(f"URLs: {len(urls)}, loaded {REPEATS} times each")
+        for test_type in get_registered_tests():
+            profile = controller.profiles[test_type]
+            legacy_times, profile_times = [], []
+            for _ in range(REPEATS):
+                # The loads alternate, so a change in the site's response times affects both alike
+                for url in urls:
+                    legacy_times.append(load_page(legacy_controller, url))
+                    controller.apply_profile(profile)
+                    profile_times.append(load_page(controller, url))
+            legacy_time, profile_time = statistics.median(legacy_times), statistics.median(profile_times)
+            print(f"{test_type} ({profile.name} profile): {legacy_time:.2f}s before, {profile_time:.2f}s now, "
+                  f"saving {(1 - profile_time / legacy_time) * 100:.0f}% per load")
+    finally:
+        legacy_controller.driver.quit()
+        controller.tear_down()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+dispatch_benchmark.py - A micro-benchmark of the per-row dispatch overhead of the TestController.
+
+Compares running a row the way the controller used to, by rebuilding a dictionary of bound methods and re-parsing the
+test input on every row, with TestController.run_test on a compiled TestPlanRow. Both print and log the result of every row,
+as the controllers do, with the messages sent to os.devnull and logging disabled. The tests are stubs which return
+immediately, and no browser is launched, so only the dispatch and its messages are measured.
+
+Usage: python benchmarks/dispatch_benchmark.py [number_of_rows]
+"""
+
+import contextlib
+import logging
+import os
+import sys
+import timeit
+
+from colorama import Fore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test_suites.registry import get_registered_tests
+from test_suites.test_controller import TestController
+from test_suites.test_plan import compile_row
+from utils.browser_utils import BROWSER_PROFILES, FULL_PROFILE
+
+# One row of each type of test, with a valid input where the type needs one
+SAMPLE_ROWS = [
+    {"url": "https://example.org/", "test_type": "site_availability_test", "test_input": ""},
+    {"url": "https://example.org/collections", "test_type": "collection_count_test", "test_input": "12"},
+    {"url": "https://example.org/node/1", "test_type": "mirador_page_count_test", "test_input": "5"},
+    {"url": "https://example.org/node/1", "test_type": "element_present_test", "test_input": "class|field--name-title"},
+    {"url": "https://example.org/node/1", "test_type": "permalink_redirect_test", "test_input": "https://example.org/n1"},
+    {"url": "https://example.org/oai", "test_type": "rest_oai_pmh_xml_validity_test", "test_input": ""},
+]
+
+
+class StubTest():
+    """
+    A test which passes immediately.
+    """
+    def run(self, url: str, *arguments) -> None:
+        pass
+
+
+class StubDriver():
+    """
+    A driver whose session is always alive.
+    """
+    def execute_script(self, script: str, *arguments):
+        return 1
+
+
+class LegacyController():
+    """
+    A controller which dispatches rows the way TestController did before the test plan was compiled.
+    """
+    def __init__(self) -> None:
+        self.test = StubTest()
+
+    def run_no_input_test(self, csv_row: dict, csv_row_number: int) -> bool:
+        try:
+            self.test.run(csv_row["url"])
+        except AssertionError as e:
+            print(Fore.RED, f"Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"Test failed on row {csv_row_number + 1}. {e}")
+            return False
+        else:
+            print(Fore.GREEN, f"Test passed on row {csv_row_number + 1}.", Fore.RESET)
+            logging.info(f"Test passed on row {csv_row_number + 1}.")
+            return True
+
+    def run_count_test(self, csv_row: dict, csv_row_number: int) -> bool:
+        try:
+            self.test.run(csv_row["url"], int(csv_row["test_input"]))
+        except ValueError:
+            print(Fore.RED, f"Invalid test input on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"Invalid test input on row {csv_row_number + 1}. The test input must be an integer.")
+            return False
+        except AssertionError as e:
+            print(Fore.RED, f"Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"Test failed on row {csv_row_number + 1}. {e}")
+            return False
+        else:
+            print(Fore.GREEN, f"Test passed on row {csv_row_number + 1}.", Fore.RESET)
+            logging.info(f"Test passed on row {csv_row_number + 1}.")
+            return True
+
+    def run_element_present_test(self, csv_row: dict, csv_row_number: int) -> bool:
+        try:
+            self.test.run(csv_row["url"], *(csv_row["test_input"].split('|')))
+        except AssertionError as e:
+            print(Fore.RED, f"Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"Test failed on row {csv_row_number + 1}. {e}")
+            return False
+        else:
+            print(Fore.GREEN, f"Test passed on row {csv_row_number + 1}.", Fore.RESET)
+            logging.info(f"Test passed on row {csv_row_number + 1}.")
+            return True
+
+    def run_text_input_test(self, csv_row: dict, csv_row_number: int) -> bool:
+        try:
+            self.test.run(csv_row["url"], csv_row["test_input"])
+        except AssertionError as e:
+            print(Fore.RED, f"Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"Test failed on row {csv_row_number + 1}. {e}")
+            return False
+        else:
+            print(Fore.GREEN, f"Test passed on row {csv_row_number + 1}.", Fore.RESET)
+            logging.info(f"Test passed on row {csv_row_number + 1}.")
+            return True
+
+    def run_test(self, csv_row: dict, csv_row_number: int) -> bool:
+        test_methods = {
+            'collection_count_test': self.run_count_test,
+            'site_availability_test': self.run_no_input_test,
+            'openseadragon_load_test': self.run_no_input_test,
+            'mirador_viewer_load_test': self.run_no_input_test,
+            'mirador_page_count_test': self.run_count_test,
+            'ableplayer_load_test': self.run_no_input_test,
+            'ableplayer_transcript_load_test': self.run_no_input_test,
+            'element_present_test': self.run_element_present_test,
+            'invalid_links_test': self.run_no_input_test,
+            'permalink_redirect_test': self.run_text_input_test,
+            'rest_oai_pmh_xml_validity_test': self.run_no_input_test
+        }
+        return test_methods[csv_row["test_type"]](csv_row, csv_row_number)
+
+
+def create_plan_controller() -> TestController:
+    """ Return a TestController whose tests are all stubs, without launching a driver. """
+    controller = TestController.__new__(TestController)
+    controller.driver = StubDriver()
+    controller.tests = {test_type: StubTest() for test_type in get_registered_tests()}
+    # Every test shares a profile which is already applied, so applying it costs only the comparison
+    controller.profiles = {test_type: BROWSER_PROFILES[FULL_PROFILE] for test_type in get_registered_tests()}
+    controller.active_profile = BROWSER_PROFILES[FULL_PROFILE]
+    return controller
+
+
+def main() -> None:
+    number_of_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    csv_rows = [SAMPLE_ROWS[index % len(SAMPLE_ROWS)] for index in range(number_of_rows)]
+    plan_rows = [compile_row(csv_row, row_number) for row_number, csv_row in enumerate(csv_rows, start=1)]
+    legacy_controller = LegacyController()
+    plan_controller = create_plan_controller()
+
+    def run_legacy() -> None:
+        for row_number, csv_row in enumerate(csv_rows, start=1):
+            legacy_controller.run_test(csv_row, row_number)
+
+    def run_plan() -> None:
+        for plan_row in plan_rows:
+            plan_controller.run_test(plan_row)
+
+    # Both controllers print and log the result of every row, which is measured too but kept off the console
+    logging.disable(logging.CRITICAL)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        legacy_time = min(timeit.repeat(run_legacy, number=1, repeat=5))
+        plan_time = min(timeit.repeat(run_plan, number=1, repeat=5))
+    logging.disable(logging.NOTSET)
+    print(f"Rows: {number_of_rows}")
+    print(f"Legacy run_test: {legacy_time / number_of_rows * 1e9:.0f} ns per row")
+    print(f"TestController.run_test on the compiled plan: {plan_time / number_of_rows * 1e9:.0f} ns per row "
+          f"({legacy_time / plan_time:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,20 @@ This module contains the CollectionPage class, which represents a page displayin
 
 The CollectionPage class inherits from the BasePage class and provides methods for checking whether various viewers
 (OpenSeadragon, Mirador, Ableplayer) load on the page, getting the number of pages in the mirador viewer, and getting
-the URL that the ARK permalink redirects to.
+the URL that the ARK permalink redirects to. The viewers are waited on through DomSnapshots, which report the state of every
+viewer in a single round-trip to the driver.
 """
 
 from typing import Optional
 
-from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.remote.webdriver import WebDriver
 
 from pages.page import BasePage
+from utils.rate_limit_utils import get_rate_limiter
+
+# The XPath of the link the ARK permalink is displayed as
+PERMALINK_XPATH = "/html/body/div/div[2]/div/div[2]/div/div/div/div/div/div[2]/main/section/section/div[5]/div/div/div/div/div/div/span/div/div[3]/a"
 
 
 class CollectionPage(BasePage):
@@ -28,64 +32,47 @@ class CollectionPage(BasePage):
 
     def is_openseadragon_loads(self) -> bool:
         """Return whether the OpenSeadragon viewer loads on the page."""
-        self.driver.get(self.url)
-        try:
-            self.driver.find_element(By.CLASS_NAME, "openseadragon-container").find_element(By.TAG_NAME, "canvas")
-            return True
-        except NoSuchElementException:
-            return False
+        self.load()
+        return self.wait_for_snapshot(lambda snapshot: snapshot.viewers["openseadragon"], timing_phase="viewer_ready") is not None
 
     def is_mirador_loads(self) -> bool:
         """Return whether the Mirador viewer loads on the page."""
-        self.driver.get(self.url)
-        try:
-            self.driver.implicitly_wait(40)  # Wait up to 40 seconds for the element to appear
-            self.driver.find_element(By.CLASS_NAME, "mirador-viewer").find_element(By.TAG_NAME, "canvas")
-            self.driver.implicitly_wait(20)  # Reset the implicit wait
-            return True
-        except NoSuchElementException:
-            self.driver.implicitly_wait(20)  # Reset the implicit wait
-            return False
+        self.load()
+        return self.wait_for_snapshot(lambda snapshot: snapshot.viewers["mirador"], timing_phase="viewer_ready") is not None
 
     def get_mirador_page_count(self) -> Optional[int]:
         """Return the number of pages in the Mirador viewer, None if the viewer is not present."""
-        self.driver.get(self.url)
-        try:
-            self.driver.implicitly_wait(40)  # Wait up to 40 seconds for the element to appear
-            count = self.driver.find_elements(By.XPATH, "//*[contains(text(), '1 of ') and not(contains(text(), '1 of 0'))]")[0].text.split(" ")[2]
-            self.driver.implicitly_wait(20)  # Reset the implicit wait
-            return int(count)
-        except NoSuchElementException:
-            self.driver.implicitly_wait(20)  # Reset the implicit wait
+        self.load()
+        # Wait for the element displaying "1 of x"
+        snapshot = self.wait_for_snapshot(lambda snapshot: snapshot.viewers["mirador_page_counter"] is not None,
+                                          timing_phase="viewer_ready")
+        if snapshot is None:
             return None
+        return int(snapshot.viewers["mirador_page_counter"].split(" ")[2])
 
     def is_ableplayer_loads(self) -> bool:
         """Return whether the ableplayer loads on the page."""
-        self.driver.get(self.url)
-        try:
-            self.driver.find_element(By.CLASS_NAME, "able")
-            return True
-        except NoSuchElementException:
-            return False
+        self.load()
+        return self.wait_for_snapshot(lambda snapshot: snapshot.viewers["ableplayer"], timing_phase="viewer_ready") is not None
 
     def is_ableplayer_transcript_loads(self) -> bool:
         """Return whether the ableplayer transcript loads on the page."""
-        self.driver.get(self.url)
-        try:
-            self.driver.find_element(By.CLASS_NAME, "able-transcript")
-            return True
-        except NoSuchElementException:
-            return False
+        self.load()
+        return self.wait_for_snapshot(lambda snapshot: snapshot.viewers["ableplayer_transcript"]) is not None
 
     def get_permalink_redirect_url(self) -> Optional[str]:
-        """Return the url that the permalink redirects to, None if not present."""
-        self.driver.get(self.url)
-        try:
-            permalink_url = self.driver.find_element(
-                By.XPATH,
-                "/html/body/div/div[2]/div/div[2]/div/div/div/div/div/div[2]/main/section/section/div[5]/div/div/div/div/div/div/span/div/div[3]/a"
-            ).get_attribute("href")
-            self.driver.get(permalink_url)
-            return self.driver.current_url
-        except NoSuchElementException:
+        """Return the url that the permalink redirects to, None if not present. Raises a NoSuchElementException if the
+        permalink has no link target."""
+        self.load()
+        snapshot = self.wait_for_snapshot(lambda snapshot: snapshot.probes[0].found, probes=(("xpath", PERMALINK_XPATH),))
+        if snapshot is None:
             return None
+        permalink_url = snapshot.probes[0].href
+        if permalink_url is None:
+            raise NoSuchElementException(f"The permalink on {self.url} has no href.")
+        # The driver navigates away from the page, so it is no longer loaded
+        BasePage.invalidate(self.driver)
+        BasePage.count_navigation(self.driver)
+        with get_rate_limiter().limit(permalink_url):
+            self.driver.get(permalink_url)
+        return self.driver.current_url
@@ -9,8 +9,6 @@ of collections on the collections page.
 from typing import Optional
 
 from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException
 
 from pages.page import BasePage
 
@@ -27,10 +25,9 @@ class CollectionsOrAdvancedSearchPage(BasePage):
 
     def get_collection_count(self) -> Optional[int]:
         """Return the number of collections on the collections page."""
-        self.driver.get(self.url)
-        try:
-            # Get the element displaying "x - y of z"
-            pager_summary = self.driver.find_element(By.CLASS_NAME, "pager__summary")
-            return int(pager_summary.text.split(" ")[-1])  # We only need the last number (z)
-        except NoSuchElementException:
-            return None
\ No newline at end of file
+        self.load()
+        # Get the element displaying "x - y of z"
+        snapshot = self.wait_for_snapshot(lambda snapshot: snapshot.probes[0].found, probes=(("class", "pager__summary"),))
+        if snapshot is None:
+            return None
+        return int(snapshot.probes[0].text.split(" ")[-1])  # We only need the last number (z)
@@ -0,0 +1,99 @@
+"""
+This module contains the DomSnapshot class, a plain copy of everything the tests need to know about a loaded page.
+
+A snapshot is taken with a single execute_script call, which collects the page title, the links on the page, the state of the
+viewers, and the first element matching each of a list of probed selectors. Tests then make their assertions against the
+snapshot in Python, instead of paying a WebDriver round-trip for every element and attribute they look at.
+"""
+
+from typing import NamedTuple, Optional
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# The XPath of the Mirador element displaying "1 of x", once the viewer knows how many pages it has
+MIRADOR_PAGE_COUNTER_XPATH = "//*[contains(text(), '1 of ') and not(contains(text(), '1 of 0'))]"
+
+# JavaScript collecting a snapshot of the page. Its arguments are the list of [method, selector] probes, and whether to
+# collect the links on the page.
+SNAPSHOT_SCRIPT = """
+const probes = arguments[0] || [];
+const includeLinks = arguments[1];
+function findFirst(method, selector) {
+    switch (method) {
+        case "id":
+            return document.getElementById(selector);
+        case "class":
+            return document.getElementsByClassName(selector)[0] || null;
+        case "css":
+            return document.querySelector(selector);
+        case "xpath":
+            return document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    return null;
+}
+function describe(element) {
+    if (!element) {
+        return {found: false, text: null, href: null};
+    }
+    const text = element.innerText !== undefined ? element.innerText : element.textContent;
+    return {found: true, text: text === null ? null : text.trim(), href: element.href || null};
+}
+const miradorPageCounter = findFirst("xpath", arguments[2]);
+return {
+    title: document.title,
+    url: location.href,
+    elapsed: performance.now(),
+    links: includeLinks
+        ? Array.from(document.querySelectorAll("a[href]"), link => link.href).filter(href => href.startsWith("http"))
+        : [],
+    probes: probes.map(probe => describe(findFirst(probe[0], probe[1]))),
+    viewers: {
+        openseadragon: document.querySelector(".openseadragon-container canvas") !== null,
+        mirador: document.querySelector(".mirador-viewer canvas") !== null,
+        mirador_page_counter: miradorPageCounter ? describe(miradorPageCounter).text : null,
+        ableplayer: document.getElementsByClassName("able").length > 0,
+        ableplayer_transcript: document.getElementsByClassName("able-transcript").length > 0
+    }
+};
+"""
+
+PROBE_METHODS = {"id", "class", "css", "xpath"}  # The ways a probe can select an element
+
+
+class ProbeResult(NamedTuple):
+    """
+    The first element matching a probed selector.
+    """
+    found: bool  # Whether any element matched
+    text: Optional[str]  # The visible text of the element
+    href: Optional[str]  # The absolute target of the element, if it is a link
+
+
+class DomSnapshot(NamedTuple):
+    """
+    A plain copy of the state of a loaded page.
+    """
+    title: str  # The title of the page
+    url: str  # The URL the driver is on, after any redirects
+    elapsed: float  # The number of seconds from the start of the navigation to the snapshot
+    links: tuple  # The absolute http(s) targets of every <a href> on the page, if they were collected
+    probes: tuple  # The ProbeResult of each probe, in the order they were given
+    viewers: dict  # Maps openseadragon, mirador, ableplayer and ableplayer_transcript to whether they have loaded, and
+    # mirador_page_counter to the text of the Mirador page counter or None
+
+
+def take_snapshot(driver: WebDriver, probes: tuple = (), include_links: bool = False) -> DomSnapshot:
+    """ Return a DomSnapshot of the page loaded in <driver>, with the first element matching each (method, selector) pair in
+    <probes>. The links on the page are only collected if <include_links> is set. Raises a ValueError if a probe has an
+    invalid method. """
+    for method, _ in probes:
+        if method not in PROBE_METHODS:
+            raise ValueError("Invalid method.")
+    snapshot = driver.execute_script(SNAPSHOT_SCRIPT, [list(probe) for probe in probes], include_links,
+                                     MIRADOR_PAGE_COUNTER_XPATH)
+    return DomSnapshot(title=snapshot["title"],
+                       url=snapshot["url"],
+                       elapsed=snapshot["elapsed"] / 1000,  # performance.now() counts milliseconds
+                       links=tuple(snapshot["links"]),
+                       probes=tuple(ProbeResult(probe["found"], probe["text"], probe["href"]) for probe in snapshot["probes"]),
+                       viewers=snapshot["viewers"])
@@ -3,16 +3,46 @@ This module contains the BasePage class, which represents a generic website (not
 
 The BasePage class provides methods for checking whether a page is available, whether it contains an element with a given
 selector, and for finding invalid links on the page.
+
+Navigations are cached per driver, so every check on the URL the driver already has loaded runs against the same DOM. Any
+method that navigates the driver away from its page must invalidate the cache. A driver may return from a navigation as soon
+as the DOM is ready, in which case only the tests whose browser profile needs the whole page wait for the load event.
+
+Elements are found by waiting on a DomSnapshot, which polls until the elements appear, the timeout runs out, or the page turns
+out to be an error page. Each poll collects everything a check looks at in a single round-trip to the driver.
 """
 
+import weakref
 from typing import Optional
 
-from concurrent.futures import ThreadPoolExecutor
 import requests
 
 from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+from pages.dom_snapshot import PROBE_METHODS, DomSnapshot, take_snapshot
+from utils.http_utils import get_session
+from utils.link_utils import get_link_checker
+from utils.rate_limit_utils import get_rate_limiter
+from utils.timing_utils import NAVIGATION_TIMING_SCRIPT, record_navigation_timings, record_timing
+
+DEFAULT_TIMEOUT = 20  # The default number of seconds to wait for an element to appear
+DEFAULT_POLL_INTERVAL = 0.25  # The default number of seconds between checks for an element
+
+# Fragments of the titles of Drupal and web server error pages. An element will never appear on these pages.
+ERROR_PAGE_TITLE_MARKERS = ("page not found",
+                            "access denied",
+                            "the website encountered an unexpected error",
+                            "service unavailable",
+                            "bad gateway",
+                            "gateway timeout")
+
+
+class ErrorPageException(Exception):
+    """
+    Raised when a page that is waited on turns out to be an error page.
+    """
 
 
 class BasePage(object):
@@ -24,18 +54,110 @@ class BasePage(object):
     """
     driver: WebDriver  # The driver used to load the page
     url: str  # The URL of the page
+    timeout: float  # The number of seconds to wait for an element to appear
+    poll_interval: float  # The number of seconds between checks for an element
+    response: Optional[requests.Response]  # The HTTP response for the page, shared by every check in a test
+
+    # Maps each driver to the URL it currently has loaded
+    loaded_urls: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    # Maps each driver which returns from a navigation before the load event to whether its current test must wait for it
+    load_waits: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    # Maps each driver to the number of pages it has navigated to
+    navigation_counts: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
-    def __init__(self, driver: WebDriver, url: str) -> None:
+    def __init__(self, driver: WebDriver, url: str, timeout: float = DEFAULT_TIMEOUT,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
         """Initialize the page with a driver and a URL. It is assumed that the URL is valid."""
         self.driver = driver
         self.url = url
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.response = None
+
+    def get_response(self) -> requests.Response:
+        """Return the HTTP response for the page, fetching it over the shared session the first time it is needed."""
+        if self.response is None:
+            self.response = get_session().get(self.url)
+            record_timing("ttfb", self.response.elapsed.total_seconds())
+        return self.response
+
+    def load(self) -> None:
+        """Load the page in the driver, unless the driver already has the page loaded."""
+        if BasePage.loaded_urls.get(self.driver) != self.url:
+            # Forget the old page first in case the navigation fails part way
+            BasePage.invalidate(self.driver)
+            # The navigation itself counts against the host's rate limits, but the resources the page loads do not
+            BasePage.count_navigation(self.driver)
+            with get_rate_limiter().limit(self.url):
+                self.driver.get(self.url)
+            BasePage.loaded_urls[self.driver] = self.url
+        if BasePage.load_waits.get(self.driver):
+            self.wait_for_load_event()
+        # Record the phases of the page load, even if it was shared with an earlier test
+        record_navigation_timings(self.driver.execute_script(NAVIGATION_TIMING_SCRIPT))
+
+    def wait_for_load_event(self) -> None:
+        """Wait until the page has finished loading, or the page's timeout runs out. A page that is still loading is checked
+        as it is."""
+        try:
+            WebDriverWait(self.driver, self.timeout, poll_frequency=self.poll_interval).until(
+                lambda driver: driver.execute_script("return document.readyState;") == "complete")
+        except TimeoutException:
+            pass
+
+    @staticmethod
+    def count_navigation(driver: WebDriver) -> None:
+        """Count a navigation of <driver>, towards the limit after which the driver is recycled."""
+        BasePage.navigation_counts[driver] = BasePage.navigation_counts.get(driver, 0) + 1
+
+    @staticmethod
+    def invalidate(driver: WebDriver) -> None:
+        """Forget the page that <driver> has loaded, so the next check navigates again."""
+        BasePage.loaded_urls.pop(driver, None)
+
+    def raise_if_error_page(self, title: str) -> None:
+        """Raise an ErrorPageException if a page titled <title> is an error page."""
+        lowered_title = title.lower()
+        for marker in ERROR_PAGE_TITLE_MARKERS:
+            if marker in lowered_title:
+                raise ErrorPageException(f"The page at {self.url} is an error page: {title}")
+
+    def snapshot(self, probes: tuple = (), include_links: bool = False) -> DomSnapshot:
+        """Return a DomSnapshot of the page with the first element matching each (method, selector) pair in <probes>, and the
+        links on the page if <include_links> is set."""
+        return take_snapshot(self.driver, probes, include_links)
+
+    def wait_for_snapshot(self, condition, probes: tuple = (), timeout: Optional[float] = None,
+                          timing_phase: Optional[str] = None) -> Optional[DomSnapshot]:
+        """Return the first DomSnapshot of the page, with the given <probes>, for which <condition> is true, or None if there is
+        none within <timeout> seconds (the page's timeout by default). If <timing_phase> is given, the time from the start of
+        the navigation until the snapshot was taken is recorded as that phase.
+
+        Each poll is a single round-trip to the driver. Raises an ErrorPageException as soon as the page is recognized as an
+        error page, rather than waiting in vain.
+        """
+        def take_matching_snapshot(driver: WebDriver):
+            snapshot = take_snapshot(driver, probes)
+            if condition(snapshot):
+                return snapshot
+            self.raise_if_error_page(snapshot.title)
+            return False
+
+        try:
+            snapshot = WebDriverWait(self.driver, self.timeout if timeout is None else timeout,
+                                     poll_frequency=self.poll_interval).until(take_matching_snapshot)
+        except TimeoutException:
+            return None
+        if timing_phase is not None:
+            record_timing(timing_phase, snapshot.elapsed)
+        return snapshot
 
     def is_available(self) -> bool:
         """Return whether the page is available."""
-        response = requests.get(self.url)
+        response = self.get_response()
         if not (399 < response.status_code < 500) and "Page not found" not in response.text.lower():
             try:
-                self.driver.get(self.url)
+                self.load()
                 return True
             except Exception:
                 return False
@@ -43,41 +165,16 @@ class BasePage(object):
 
     def is_contains_element(self, method: str, selector: str) -> bool:
         """Return whether the page contains an element with the given selector."""
-        self.driver.get(self.url)
-        try:
-            if method == "id":
-                self.driver.find_element(By.ID, selector)
-            elif method == "class":
-                self.driver.find_element(By.CLASS_NAME, selector)
-            elif method == "css":
-                self.driver.find_element(By.CSS_SELECTOR, selector)
-            elif method == "xpath":
-                self.driver.find_element(By.XPATH, selector)
-            else:
-                raise ValueError("Invalid method.")
-            return True
-        except NoSuchElementException:
-            return False
+        if method not in PROBE_METHODS:
+            raise ValueError("Invalid method.")
+        self.load()
+        return self.wait_for_snapshot(lambda snapshot: snapshot.probes[0].found, probes=((method, selector),)) is not None
 
     def invalid_links(self) -> list:
         """Return a list of invalid links on the page.
 
-        This method is multi-threaded.
+        The links are collected in a single snapshot of the page and checked concurrently over plain HTTP, so the driver is
+        only used to load the page.
         """
-
-        def check_link(link) -> Optional[str]:
-            """Check if a link is valid. Return the link if it is invalid, otherwise return None."""
-            page = BasePage(self.driver, link)
-            if not page.is_available():
-                return link
-            return None
-
-        self.driver.get(self.url)
-        invalid_links = []  # Will contain the list of invalid links
-        links = [link.get_attribute("href") for link in self.driver.find_elements(By.TAG_NAME, "a") if link.get_attribute("href") is not None and link.get_attribute("href").startswith("http")]
-        # Check each link. The below code is multi-threaded.
-        with ThreadPoolExecutor() as executor:
-            results = executor.map(check_link, links)
-        # Filter the invalid links and return them
-        invalid_links = [link for link in results if link is not None]
-        return invalid_links
+        self.load()
+        return get_link_checker().invalid_links(list(self.snapshot(include_links=True).links))
@@ -5,8 +5,6 @@ The RestOAIPMHXMLPage class inherits from the BasePage class and provides a meth
 page is valid.
 """
 
-import requests
-
 from selenium.webdriver.remote.webdriver import WebDriver
 from pages.page import BasePage
 
@@ -27,8 +25,8 @@ class RestOAIPMHXMLPage(BasePage):
         #   - The page is unavailable as per `is_available()`
         #   - The XML on the page contains "idDoesNotExist" or "badVerb"
         if self.is_available():
-            # Send a request to get the text
-            response_text = requests.get(self.url).text
+            # Reuse the response fetched by `is_available()`
+            response_text = self.get_response().text
             if "idDoesNotExist" in response_text or "badVerb" in response_text:
                 return False
             return True
@@ -6,6 +6,7 @@ setup(
     description='An Islandora site monitoring tool',
     url='https://github.com/digitalutsc/site_watch',
     install_requires=[
+        'aiohttp',
         'colorama',
         'openpyxl',
         'requests',
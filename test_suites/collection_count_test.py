@@ -10,9 +10,12 @@ from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.remote.webdriver import WebDriver
 
 from pages.collections_or_advanced_search_page import CollectionsOrAdvancedSearchPage
+from test_suites.registry import register_test, parse_count_input
 from test_suites.test import Test
+from utils.browser_utils import LEAN_PROFILE
 
 
+@register_test
 class CollectionCountTest(Test):
     """
     A test to check that the number of collections on the collections page is correct.
@@ -20,17 +23,19 @@ class CollectionCountTest(Test):
     The CollectionCountTest class inherits from the Test class and provides a method for running the test on a given URL
     and comparing the result to an expected value.
     """
+    test_type = "collection_count_test"
+    name = "Collection Count Test"
+    requires_input = True
+    cost = 3.0
+    browser_profile = LEAN_PROFILE
+    failure_detail = "The expected number of collections was not found. "
+    parse_input = staticmethod(parse_count_input)
     driver: WebDriver  # The driver used to load the page
 
-    def run(self, url: str, expected_value: str) -> None:
+    def run(self, url: str, expected_value: int) -> None:
         """ Run the collection count test on the page at <url> with <expected_value>."""
-        try:
-            expected_value = int(expected_value)
-        except ValueError:
-            raise ValueError(f"Expected value must be an integer, but got {expected_value}.")
-        collection_page = CollectionsOrAdvancedSearchPage(self.driver, url)
-        try:
-            actual_value = int(collection_page.get_collection_count())
-        except NoSuchElementException:
+        collection_page = CollectionsOrAdvancedSearchPage(self.driver, url, self.timeout, self.poll_interval)
+        actual_value = collection_page.get_collection_count()
+        if actual_value is None:
             raise NoSuchElementException(f"Could not find the collections count at {url}.")
         assert actual_value == expected_value, f"Expected {expected_value}, but got {actual_value}."
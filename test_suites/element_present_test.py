@@ -7,10 +7,13 @@ selector.
 
 from selenium.webdriver.remote.webdriver import WebDriver
 
+from test_suites.registry import parse_element_input, register_test
 from test_suites.test import Test
+from utils.browser_utils import LEAN_PROFILE
 from pages.page import BasePage
 
 
+@register_test
 class ElementPresentTest(Test):
     """
     A test to check whether a given element is present on a web page.
@@ -18,9 +21,15 @@ class ElementPresentTest(Test):
     The ElementPresentTest class inherits from the Test class and provides a method for running the test on a given URL and
     selector.
     """
+    test_type = "element_present_test"
+    name = "Element Present Test"
+    requires_input = True
+    cost = 3.0
+    browser_profile = LEAN_PROFILE
+    parse_input = staticmethod(parse_element_input)
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str, method: str, selector: str) -> None:
         """ Run the element present test with <method> and <selector> on the page at <url>."""
-        page = BasePage(self.driver, url)
+        page = BasePage(self.driver, url, self.timeout, self.poll_interval)
         assert page.is_contains_element(method, selector), f"Element with selector {selector} is not present on page with URL {url}."
@@ -6,19 +6,32 @@ The InvalidLinksTest class inherits from the Test class and provides a method fo
 
 from selenium.webdriver.remote.webdriver import WebDriver
 
+from test_suites.registry import HTTP_BACKEND, register_test
 from test_suites.test import Test
+from utils.browser_utils import LEAN_PROFILE
 from pages.page import BasePage
 
 
+@register_test
 class InvalidLinksTest(Test):
     """
     A test to check whether a given web page has any invalid links.
 
     The InvalidLinksTest class inherits from the Test class and provides a method for running the test on a given URL.
     """
+    test_type = "invalid_links_test"
+    name = "Invalid Links Test"
+    backend = HTTP_BACKEND
+    cost = 10.0
+    browser_profile = LEAN_PROFILE
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str) -> None:
         """ Run the invalid links test on the page at <url>."""
-        invalid_links = BasePage(self.driver, url).invalid_links()
+        invalid_links = BasePage(self.driver, url, self.timeout, self.poll_interval).invalid_links()
         assert len(invalid_links) == 0, f"Page with URL {url} has invalid links. Particular links: {invalid_links}"
+
+    @classmethod
+    async def run_http(cls, engine, session, url: str, timings: dict) -> tuple:
+        """ Run the test on the page at <url> in the AsyncHTTPEngine <engine> and return a tuple of (result, message)."""
+        return await engine.has_no_invalid_links(session, url, timings)
@@ -0,0 +1,46 @@
+"""
+This module contains the OAIPMHHarvestTest class, which is a test to check that a whole OAI-PMH list can be harvested.
+
+The OAIPMHHarvestTest class inherits from the Test class and provides a method for running the test on a given ListRecords or
+ListIdentifiers URL, optionally with the minimum number of items the list must have.
+"""
+
+import logging
+from typing import Optional
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from test_suites.registry import HTTP_BACKEND, parse_optional_count_input, register_test
+from test_suites.test import Test
+from utils.http_utils import get_session
+from utils.oai_pmh_utils import harvest
+
+logging = logging.getLogger(__name__)
+
+
+@register_test
+class OAIPMHHarvestTest(Test):
+    """
+    A test to check that every page of an OAI-PMH list is well-formed and that the list has the expected number of items.
+
+    The OAIPMHHarvestTest class inherits from the Test class and provides a method for running the test on a given URL.
+    """
+    test_type = "oai_pmh_harvest_test"
+    name = "OAI-PMH Harvest Test"
+    backend = HTTP_BACKEND
+    cost = 30.0
+    failure_detail = "The OAI-PMH list could not be harvested. "
+    parse_input = staticmethod(parse_optional_count_input)
+    driver: WebDriver  # The driver used to load the page
+
+    def run(self, url: str, expected_item_count: Optional[int] = None) -> None:
+        """ Run the OAI-PMH harvest test on the list at <url> over the shared HTTP session."""
+        report = harvest(get_session(), url, expected_item_count)
+        logging.info(report.summarize())
+        failure = report.get_failure()
+        assert failure is None, failure
+
+    @classmethod
+    async def run_http(cls, engine, session, url: str, timings: dict, expected_item_count: Optional[int] = None) -> tuple:
+        """ Run the test on the list at <url> in the AsyncHTTPEngine <engine> and return a tuple of (result, message)."""
+        return await engine.harvest_oai_pmh(session, url, timings, expected_item_count)
@@ -7,19 +7,28 @@ The PermalinkRedirectTest class inherits from the Test class and provides a meth
 from selenium.webdriver.remote.webdriver import WebDriver
 
 from pages.collection_page import CollectionPage
+from test_suites.registry import parse_text_input, register_test
 from test_suites.test import Test
+from utils.browser_utils import LEAN_PROFILE
 
 
+@register_test
 class PermalinkRedirectTest(Test):
     """
     A test to check whether a given permalink redirects to the expected URL.
 
     The PermalinkRedirectTest class inherits from the Test class and provides a method for running the test on a given URL and expected URL.
     """
+    test_type = "permalink_redirect_test"
+    name = "Permalink Redirect Test"
+    requires_input = True
+    cost = 4.0
+    browser_profile = LEAN_PROFILE
+    parse_input = staticmethod(parse_text_input)
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str, expected_url: str) -> None:
         """ Run the permalink redirect test on the page at <url>."""
-        collection_page = CollectionPage(self.driver, url)
+        collection_page = CollectionPage(self.driver, url, self.timeout, self.poll_interval)
         actual_url = collection_page.get_permalink_redirect_url()
         assert actual_url == expected_url, f"Expected {expected_url}, but got {actual_url}."
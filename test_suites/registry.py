@@ -0,0 +1,85 @@
+"""
+This module contains the test registry, which maps every test type that can appear in the test data to the Test class which
+runs it.
+
+A test registers itself with the register_test decorator and declares its name, input parser, execution backend and cost
+estimate as class attributes. Site-specific tests can be shipped as plugin modules, listed under the "plugins" key of the
+configuration file, which register their tests when they are imported.
+"""
+
+import importlib
+import logging
+
+logging = logging.getLogger(__name__)
+
+BROWSER_BACKEND = "browser"  # The test needs a rendered page, so it runs in a TestController
+HTTP_BACKEND = "http"  # The test only needs HTTP responses, so it can also run in the AsyncHTTPEngine
+BACKENDS = {BROWSER_BACKEND, HTTP_BACKEND}
+
+TEST_REGISTRY = {}  # Maps each registered test type to its Test class
+
+
+def parse_no_input(test_input: str) -> tuple:
+    """ Return the arguments of a test which takes no input. """
+    return ()
+
+
+def parse_count_input(test_input: str) -> tuple:
+    """ Return the arguments of a test whose input is an expected count. Raises a ValueError if it is not an integer. """
+    try:
+        return int(test_input),
+    except ValueError:
+        raise ValueError(f"The test input must be an integer, but got {test_input}")
+
+
+def parse_optional_count_input(test_input: str) -> tuple:
+    """ Return the arguments of a test whose input is an optional expected count. Raises a ValueError if it is given and is
+    not an integer. """
+    if not test_input:
+        return ()
+    return parse_count_input(test_input)
+
+
+def parse_element_input(test_input: str) -> tuple:
+    """ Return the (method, selector) arguments of an Element Present Test, which are separated by a '|'. Raises a
+    ValueError if there are not exactly two. """
+    arguments = tuple(test_input.split("|"))
+    if len(arguments) != 2:
+        raise ValueError("The test input for element_present_test must be two inputs separated by a '|'")
+    return arguments
+
+
+def parse_text_input(test_input: str) -> tuple:
+    """ Return the arguments of a test whose input is used as it is. """
+    return test_input,
+
+
+def register_test(test_class: type) -> type:
+    """ Register <test_class> under its test_type and return it, so it can be used as a class decorator. Raises a ValueError
+    if the class does not declare a test type and name, declares an unknown backend, or reuses a registered test type. """
+    if not test_class.test_type or not test_class.name:
+        raise ValueError(f"{test_class.__name__} must declare a test_type and a name to be registered.")
+    if test_class.backend not in BACKENDS:
+        raise ValueError(f"{test_class.__name__} has an invalid backend: {test_class.backend}")
+    registered_class = TEST_REGISTRY.get(test_class.test_type)
+    if registered_class is not None and registered_class is not test_class:
+        raise ValueError(f"The test type {test_class.test_type} is already registered by {registered_class.__name__}.")
+    TEST_REGISTRY[test_class.test_type] = test_class
+    return test_class
+
+
+def get_test_class(test_type: str):
+    """ Return the Test class registered for <test_type>, or None if there is none. """
+    return TEST_REGISTRY.get(test_type)
+
+
+def get_registered_tests() -> dict:
+    """ Return a dictionary mapping each registered test type to its Test class. """
+    return dict(TEST_REGISTRY)
+
+
+def load_plugins(module_names: list) -> None:
+    """ Import every module in <module_names>, which register their tests with register_test when they are imported. """
+    for module_name in module_names:
+        importlib.import_module(module_name)
+        logging.info(f"Loaded the test plugin {module_name}.")
@@ -7,18 +7,29 @@ The RestOAIPMHXMLValidityTest class inherits from the Test class and provides a
 from selenium.webdriver.remote.webdriver import WebDriver
 
 from pages.rest_oai_pmh_xml_page import RestOAIPMHXMLPage
+from test_suites.registry import HTTP_BACKEND, register_test
 from test_suites.test import Test
 
 
+@register_test
 class RestOAIPMHXMLValidityTest(Test):
     """
     A test to check that the rest_oai_pmh_xml page is valid XML.
 
     The RestOAIPMHXMLValidityTest class inherits from the Test class and provides a method for running the test on a given URL.
     """
+    test_type = "rest_oai_pmh_xml_validity_test"
+    name = "REST OAI-PMH XML Validity Test"
+    backend = HTTP_BACKEND
+    cost = 1.0
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str) -> None:
         """ Run the rest_oai_pmh_xml validity test on the page at <url>."""
-        rest_oai_pmh_xml_page = RestOAIPMHXMLPage(self.driver, url)
+        rest_oai_pmh_xml_page = RestOAIPMHXMLPage(self.driver, url, self.timeout, self.poll_interval)
         assert rest_oai_pmh_xml_page.is_valid_xml(), "REST OAI PMH XML page is not valid XML."
+
+    @classmethod
+    async def run_http(cls, engine, session, url: str, timings: dict) -> tuple:
+        """ Run the test on the page at <url> in the AsyncHTTPEngine <engine> and return a tuple of (result, message)."""
+        return await engine.is_valid_xml(session, url, timings)
@@ -7,18 +7,32 @@ The SiteAvailabilityTest class inherits from the Test class and provides a metho
 from selenium.webdriver.remote.webdriver import WebDriver
 
 from pages.page import BasePage
+from test_suites.registry import HTTP_BACKEND, register_test
 from test_suites.test import Test
+from utils.browser_utils import LEAN_PROFILE
 
 
+@register_test
 class SiteAvailabilityTest(Test):
     """
     A test to check whether a given web page is available.
 
     The SiteAvailabilityTest class inherits from the Test class and provides a method for running the test on a given URL.
     """
+    test_type = "site_availability_test"
+    name = "Site Availability Test"
+    backend = HTTP_BACKEND
+    cost = 1.0
+    browser_profile = LEAN_PROFILE
+    failure_detail = "The site was not available. "
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str):
         """ Run the site availability test on the page at <url>."""
-        base_page = BasePage(self.driver, url)
+        base_page = BasePage(self.driver, url, self.timeout, self.poll_interval)
         assert base_page.is_available(), f"Page at {url} is not available."
+
+    @classmethod
+    async def run_http(cls, engine, session, url: str, timings: dict) -> tuple:
+        """ Run the test on the page at <url> in the AsyncHTTPEngine <engine> and return a tuple of (result, message)."""
+        return await engine.is_available(session, url, timings)
@@ -0,0 +1,43 @@
+"""
+This module contains the SiteCrawlTest class, which is a test to check that there are no broken links on a site.
+
+The SiteCrawlTest class inherits from the Test class and provides a method for crawling the site from a given URL, following the
+links on the same host up to the depth and page budget in the "crawl" key of the configuration file.
+"""
+
+import logging
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from test_suites.registry import HTTP_BACKEND, register_test
+from test_suites.test import Test
+from utils.crawl_utils import crawl, get_crawl_config, get_findings_writer
+
+logging = logging.getLogger(__name__)
+
+
+@register_test
+class SiteCrawlTest(Test):
+    """
+    A test to check that no page reachable from a given web page, within the crawl budget, has broken links.
+
+    The SiteCrawlTest class inherits from the Test class and provides a method for running the test on a given URL.
+    """
+    test_type = "site_crawl_test"
+    name = "Site Crawl Test"
+    backend = HTTP_BACKEND
+    cost = 60.0
+    failure_detail = "The crawl found broken links. "
+    driver: WebDriver  # The driver used to load the page
+
+    def run(self, url: str) -> None:
+        """ Run the site crawl test from the page at <url> over the shared HTTP session."""
+        site_crawl = crawl(url, get_crawl_config(), get_findings_writer())
+        logging.info(site_crawl.summarize())
+        failure = site_crawl.get_failure()
+        assert failure is None, failure
+
+    @classmethod
+    async def run_http(cls, engine, session, url: str, timings: dict) -> tuple:
+        """ Run the test from the page at <url> in the AsyncHTTPEngine <engine> and return a tuple of (result, message)."""
+        return await engine.crawl_site(session, url, timings, get_crawl_config())
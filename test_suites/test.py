@@ -4,13 +4,52 @@ This module contains the Test class, which is a base class for all tests.
 
 from selenium.webdriver.remote.webdriver import WebDriver
 
+from pages.page import DEFAULT_POLL_INTERVAL, DEFAULT_TIMEOUT
+from test_suites.registry import BROWSER_BACKEND, parse_no_input
+from utils.browser_utils import STANDARD_PROFILE
+
 
 class Test():
     """
     An Abstract Base Class for tests.
+
+    Subclasses declare how they appear in the test data with the class attributes below, and are made available with the
+    register_test decorator.
     """
+    test_type: str = ""  # The test type which selects this test in the test data
+    name: str = ""  # The name of the test in messages
+    requires_input: bool = False  # Whether the test data must have a test input column for this test
+    backend: str = BROWSER_BACKEND  # Where the test prefers to run, either BROWSER_BACKEND or HTTP_BACKEND
+    cost: float = 5.0  # An estimate of the number of seconds the test takes, used before it has any recorded history
+    failure_detail: str = ""  # Explains an assertion failure in the log, before the assertion's own message
+    parse_input = staticmethod(parse_no_input)  # Parses the test input into the arguments of run after the URL
+    supports_iiif: bool = False  # Whether the test can run against the page's IIIF manifest over HTTP in IIIF mode
+    browser_profile: str = STANDARD_PROFILE  # The name of the browser profile the test's page is loaded with
+
     driver: WebDriver  # The driver used to load the page
+    timeout: float  # The number of seconds to wait for an element to appear
+    poll_interval: float  # The number of seconds between checks for an element
 
-    def __init__(self, driver: WebDriver) -> None:
-        """ Create a new Test object with the given driver. """
+    def __init__(self, driver: WebDriver, timeout: float = DEFAULT_TIMEOUT, poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        """ Create a new Test object with the given driver and wait settings. """
         self.driver = driver
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def run(self, url: str, *arguments) -> None:
+        """ Run the test on the page at <url> with the parsed <arguments>. Raises an AssertionError if the test fails. """
+        raise NotImplementedError
+
+    @classmethod
+    async def run_http(cls, engine, session, url: str, timings: dict, *arguments) -> tuple:
+        """ Run the test on the page at <url> in the AsyncHTTPEngine <engine> with its aiohttp <session>, recording the
+        phases of the request in <timings>, and return a tuple of (result, message). Only tests with the HTTP_BACKEND need
+        to implement this. """
+        raise NotImplementedError
+
+    @classmethod
+    async def run_iiif(cls, engine, session, url: str, timings: dict, *arguments) -> tuple:
+        """ Run the test on the page at <url> in IIIF mode, reading the IIIF resources of the page with the AsyncHTTPEngine
+        <engine> instead of rendering it, and return a tuple of (result, message). Only tests which support IIIF mode need to
+        implement this. """
+        raise NotImplementedError
@@ -1,294 +1,164 @@
 """
 This module contains the TestController class, which is a master controller for every type of test.
 
-The main method of this class is the run_test method.
+The main method of this class is the run_test method, which runs a compiled row of the test plan.
 """
 
 import logging
+from typing import Optional
 
 from colorama import Fore
 from selenium import webdriver
+from selenium.common.exceptions import UnexpectedAlertPresentException
 
-from test_suites.collection_count_test import *
-from test_suites.element_present_test import *
-from test_suites.invalid_links_test import *
-from test_suites.permalink_redirect_test import *
-from test_suites.rest_oai_pmh_xml_validity_test import *
-from test_suites.site_availibility_test import *
-from test_suites.viewer_tests import *
+from pages.page import BasePage, DEFAULT_POLL_INTERVAL, DEFAULT_TIMEOUT
+from test_suites.registry import get_registered_tests
+from test_suites.test_plan import TestPlanRow
+from utils.browser_utils import CHROME_ARGUMENTS, DEFAULT_BROWSER_CONFIG, BrowserProfile, get_browser_profile
+from utils.driver_health_utils import DEFAULT_DRIVER_HEALTH_CONFIG, DriverHealth
 
 logging = logging.getLogger(__name__)
 
+# The number of seconds each type of test waits for an element when the configuration file does not say otherwise
+DEFAULT_TIMEOUTS = {"default": DEFAULT_TIMEOUT,
+                    "mirador_viewer_load_test": 40,
+                    "mirador_page_count_test": 40}
 
-class TestController():
+
+class DriverCrashedError(Exception):
     """
-    A master controller for every type of test.
+    Raised when a test fails because the session of its driver has died.
     """
-    def __init__(self):
-        # Initialize the driver
-        options = webdriver.ChromeOptions()
-        options.add_argument("--headless")
-        self.driver = webdriver.Chrome(options=options)
-        self.driver.implicitly_wait(20)
-
-        # Warm up the driver
-        self.driver.get("https://google.com")
-
-        # Initialize the tests
-        self.collection_count_test = CollectionCountTest(self.driver)
-        self.site_availability_test = SiteAvailabilityTest(self.driver)
-        self.openseadragon_load_test = OpenSeaDragonLoadTest(self.driver)
-        self.mirador_load_test = MiradorLoadTest(self.driver)
-        self.mirador_page_count_test = MiradorPageCountTest(self.driver)
-        self.ableplayer_load_test = AblePlayerLoadTest(self.driver)
-        self.ableplayer_transcript_load_test = AblePlayerTranscriptLoadTest(self.driver)
-        self.element_present_test = ElementPresentTest(self.driver)
-        self.invalid_links_test = InvalidLinksTest(self.driver)
-        self.permalink_redirect_test = PermalinkRedirectTest(self.driver)
-        self.rest_oai_pmh_xml_validity_test = RestOAIPMHXMLValidityTest(self.driver)
-
-    def run_collection_count_test(self, csv_row: dict, csv_row_number: int) -> bool:
-        """ Runs a Collection Count Test. """
-        try:
-            self.collection_count_test.run(csv_row["url"], csv_row["test_input"])
-        except ValueError:
-            print(Fore.RED, f"Invalid test input on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Invalid test input on row {csv_row_number + 1}. The test input must be an integer.")
-            return False
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"Collection Count Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Collection Count Test failed on row {csv_row_number + 1}. The expected number of collections was not found. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"Collection Count Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Collection Count Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"Collection Count Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"Collection Count Test passed on row {csv_row_number + 1}.")
-            return True
-
-    def run_site_availibility_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs a Site Availibility Test. """
-        try:
-            self.site_availability_test.run(csv_row["url"])
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"Site Availability Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Site Availability Test failed on row {csv_row_number + 1}. The site was not available. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"Site Availability Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Site Availability Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"Site Availability Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"Site Availability Test passed on row {csv_row_number + 1}.")
-            return True
-
-    def run_openseadragon_load_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs an OpenSeaDragon Load Test. """
-        try:
-            self.openseadragon_load_test.run(csv_row["url"])
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"OpenSeaDragon Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"OpenSeaDragon Load Test failed on row {csv_row_number + 1}. The viewer did not load. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"OpenSeaDragon Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"OpenSeaDragon Load Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"OpenSeaDragon Load Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"OpenSeaDragon Load Test passed on row {csv_row_number + 1}.")
-            return True
 
-    def run_mirador_load_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs a Mirador Load Test. """
-        try:
-            self.mirador_load_test.run(csv_row["url"])
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"Mirador Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Mirador Load Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"Mirador Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Mirador Load Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"Mirador Load Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"Mirador Load Test passed on row {csv_row_number + 1}.")
-            return True
 
-    def run_mirador_page_count_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs a Mirador Page Count Test. """
-        try:
-            self.mirador_page_count_test.run(csv_row["url"], int(csv_row["test_input"]))
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"Mirador Page Count Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Mirador Page Count Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"Mirador Page Count Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Mirador Page Count Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"Mirador Page Count Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"Mirador Page Count Test passed on row {csv_row_number + 1}.")
-            return True
-
-    def run_ableplayer_load_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs an AblePlayer Load Test. """
+class TestController():
+    """
+    A master controller for every type of test.
+    """
+    def __init__(self, config: Optional[dict] = None):
+        config = config if config is not None else {}
+        # The number of seconds each type of test waits for an element, and how often the element is checked for
+        self.timeouts = {**DEFAULT_TIMEOUTS, **config.get("timeouts", {})}
+        self.poll_interval = config.get("poll_interval", DEFAULT_POLL_INTERVAL)
+
+        # Maps each test type to the BrowserProfile its page is loaded with
+        browser_config = {**DEFAULT_BROWSER_CONFIG, **config.get("browser", {})}
+        self.profiles = {test_type: get_browser_profile(test_class, browser_config)
+                         for test_type, test_class in get_registered_tests().items()}
+
+        # Initialize the driver options. Tests wait for elements explicitly, so the implicit wait is left at 0.
+        self.options = webdriver.ChromeOptions()
+        for argument in CHROME_ARGUMENTS + browser_config["arguments"]:
+            self.options.add_argument(argument)
+        self.options.page_load_strategy = browser_config["page_load_strategy"]
+        self.returns_before_load = browser_config["page_load_strategy"] != "normal"
+        # The limits after which the driver is recycled
+        self.health_config = {**DEFAULT_DRIVER_HEALTH_CONFIG, **config.get("driver_health", {})}
+        self.launch_driver()
+
+    def launch_driver(self):
+        """ Launches a new driver, and initializes one test of each registered type with it. """
+        self.driver = webdriver.Chrome(options=self.options)
+        self.active_profile = None  # The BrowserProfile applied to the driver, if any
+        service = getattr(self.driver, "service", None)
+        self.health = DriverHealth(service.process.pid if service is not None and service.process is not None else None)
+        # Requests can only be blocked once the network domain of the DevTools Protocol is enabled
+        self.driver.execute_cdp_cmd("Network.enable", {})
+
+        # Initialize one test of each registered type, including those from plugins. Maps each test type to its test.
+        self.tests = {test_type: test_class(self.driver, *self.get_wait_settings(test_type))
+                      for test_type, test_class in get_registered_tests().items()}
+
+    def get_wait_settings(self, test_type: str) -> tuple:
+        """ Returns a tuple of (timeout, poll_interval) for tests of type <test_type>. """
+        return self.timeouts.get(test_type, self.timeouts["default"]), self.poll_interval
+
+    def apply_profile(self, profile: BrowserProfile) -> None:
+        """ Applies <profile> to the driver. The loaded page is forgotten if it was loaded with a profile which blocked
+        something <profile> needs. """
+        if profile == self.active_profile:
+            return
+        if self.active_profile is None or not profile.allows_page_of(self.active_profile):
+            self.clear_navigation_cache()
+        if self.active_profile is None or profile.blocked_urls != self.active_profile.blocked_urls:
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(profile.blocked_urls)})
+        BasePage.load_waits[self.driver] = self.returns_before_load and profile.waits_for_load
+        self.active_profile = profile
+
+    def run_test(self, plan_row: TestPlanRow) -> bool:
+        """ Runs the test in the compiled <plan_row> and returns whether it passed. Raises a DriverCrashedError instead of
+        failing the test if the driver's session died, so the row can be replayed on a new driver. """
+        test_name = plan_row.test_class.name
+        csv_row_number = plan_row.row_number
         try:
-            self.ableplayer_load_test.run(csv_row["url"])
+            self.apply_profile(self.profiles[plan_row.test_type])
+            self.tests[plan_row.test_type].run(plan_row.url, *plan_row.arguments)
         except AssertionError as e:
+            self.raise_if_crashed(e, csv_row_number)
             # Get the assertion error message
             error_message = str(e)
-            print(Fore.RED, f"AblePlayer Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"AblePlayer Load Test failed on row {csv_row_number + 1}. The viewer did not load. {error_message}")
+            print(Fore.RED, f"{test_name} failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"{test_name} failed on row {csv_row_number + 1}. {plan_row.test_class.failure_detail}{error_message}")
             return False
         except Exception as e:
-            print(Fore.RED, f"AblePlayer Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"AblePlayer Load Test failed on row {csv_row_number + 1}. {e}")
+            self.raise_if_crashed(e, csv_row_number)
+            print(Fore.RED, f"{test_name} failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"{test_name} failed on row {csv_row_number + 1}. {e}")
             return False
         else:
-            print(Fore.GREEN, f"AblePlayer Load Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"AblePlayer Load Test passed on row {csv_row_number + 1}.")
+            print(Fore.GREEN, f"{test_name} passed on row {csv_row_number + 1}.", Fore.RESET)
+            logging.info(f"{test_name} passed on row {csv_row_number + 1}.")
             return True
 
-    def run_ableplayer_transcript_load_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs an AblePlayer Transcript Load Test. """
+    def is_session_alive(self) -> bool:
+        """ Returns whether the driver's session still answers commands. """
         try:
-            self.ableplayer_transcript_load_test.run(csv_row["url"])
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"AblePlayer Transcript Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"AblePlayer Transcript Load Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"AblePlayer Transcript Load Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"AblePlayer Transcript Load Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"AblePlayer Transcript Load Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"AblePlayer Transcript Load Test passed on row {csv_row_number + 1}.")
-            return True
-
-    def run_element_present_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs an Element Present Test. """
+            self.driver.execute_script("return 1;")
+        except UnexpectedAlertPresentException:
+            return True  # The session is alive, but a page is showing an alert
+        except Exception:
+            return False
+        return True
+
+    def raise_if_crashed(self, error: Exception, csv_row_number: int):
+        """ Raises a DriverCrashedError if the test on row <csv_row_number> failed with <error> because the driver's session
+        died. A test can fail because of a dead session in any way, even with an AssertionError, so the session itself is
+        checked. """
+        if not self.is_session_alive():
+            raise DriverCrashedError(f"The driver crashed on row {csv_row_number + 1}. {error}") from error
+
+    def get_health(self) -> DriverHealth:
+        """ Returns the DriverHealth of the driver, with the navigations it has made so far. """
+        self.health.navigations = BasePage.navigation_counts.get(self.driver, 0)
+        return self.health
+
+    def get_recycle_reason(self) -> Optional[str]:
+        """ Returns why the driver should be recycled, or None if it is healthy. """
+        return self.get_health().get_recycle_reason(self.health_config)
+
+    def recycle(self, reason: str):
+        """ Quits the driver, which is being recycled for <reason>, and launches a new one in its place. """
+        logging.warning(f"Recycling a driver {reason}. {self.get_health().summarize()}")
         try:
-            self.element_present_test.run(csv_row["url"], *(csv_row["test_input"].split('|')))
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"Element Present Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Element Present Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
-        except ValueError as e:
-            # Get the ValueError message
-            error_message = str(e)
-            print(Fore.RED, f"Element Present Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Element Present Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
+            self.driver.quit()
         except Exception as e:
-            print(Fore.RED, f"Element Present Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Element Present Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"Element Present Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"Element Present Test passed on row {csv_row_number + 1}.")
-            return True
+            # A driver which crashed may not be able to quit
+            logging.warning(f"Failed to quit a driver that is being recycled. {e}")
+        self.launch_driver()
 
-    def run_invalid_links_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs an Invalid Links Test. """
-        try:
-            self.invalid_links_test.run(csv_row["url"])
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"Invalid Links Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Invalid Links Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"Invalid Links Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Invalid Links Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"Invalid Links Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"Invalid Links Test passed on row {csv_row_number + 1}.")
-            return True
-
-    def run_permalink_redirect_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs a Permalink Redirect Test. """
-        try:
-            self.permalink_redirect_test.run(csv_row["url"], csv_row["test_input"])
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"Permalink Redirect Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Permalink Redirect Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"Permalink Redirect Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"Permalink Redirect Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"Permalink Redirect Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"Permalink Redirect Test passed on row {csv_row_number + 1}.")
-            return True
+    def warm_up(self, url: str):
+        """ Warms up the driver by loading <url>, which should be a local target such as about:blank or the first site under
+        test. """
+        self.driver.get(url)
+        self.clear_navigation_cache()
 
-    def run_rest_oai_pmh_xml_validity_test(self, csv_row: dict, csv_row_number: int):
-        """ Runs a REST OAI-PMH XML Validity Test. """
-        try:
-            self.rest_oai_pmh_xml_validity_test.run(csv_row["url"])
-        except AssertionError as e:
-            # Get the assertion error message
-            error_message = str(e)
-            print(Fore.RED, f"REST OAI-PMH XML Validity Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"REST OAI-PMH XML Validity Test failed on row {csv_row_number + 1}. {error_message}")
-            return False
-        except Exception as e:
-            print(Fore.RED, f"REST OAI-PMH XML Validity Test failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
-            logging.error(f"REST OAI-PMH XML Validity Test failed on row {csv_row_number + 1}. {e}")
-            return False
-        else:
-            print(Fore.GREEN, f"REST OAI-PMH XML Validity Test passed on row {csv_row_number + 1}.", Fore.RESET)
-            logging.info(f"REST OAI-PMH XML Validity Test passed on row {csv_row_number + 1}.")
-            return True
-
-    def run_test(self, csv_row: dict, csv_row_number: int) -> bool:
-        """ Runs a test based on the test type specified in <csv_row>. """
-        test_type = csv_row["test_type"]
-        test_methods = {
-            'collection_count_test': self.run_collection_count_test,
-            'site_availability_test': self.run_site_availibility_test,
-            'openseadragon_load_test': self.run_openseadragon_load_test,
-            'mirador_viewer_load_test': self.run_mirador_load_test,
-            'mirador_page_count_test': self.run_mirador_page_count_test,
-            'ableplayer_load_test': self.run_ableplayer_load_test,
-            'ableplayer_transcript_load_test': self.run_ableplayer_transcript_load_test,
-            'element_present_test': self.run_element_present_test,
-            'invalid_links_test': self.run_invalid_links_test,
-            'permalink_redirect_test': self.run_permalink_redirect_test,
-            'rest_oai_pmh_xml_validity_test': self.run_rest_oai_pmh_xml_validity_test
-        }
-        test_method = test_methods.get(test_type)
-        if test_method is None:
-            print(Fore.RED, f"Test type on row {csv_row_number + 1} is not supported. Please see log for more details.", Fore.RESET)
-            logging.error(f"Test type {test_type} on row {csv_row_number + 1} is not supported.")
-            return False
-        return test_method(csv_row, csv_row_number)
+    def clear_navigation_cache(self):
+        """ Forgets the page the driver has loaded, so the next test navigates to its URL again. """
+        BasePage.invalidate(self.driver)
 
     def tear_down(self):
         """ Tears down the test. """
+        health = self.get_health()
+        health.measure()
+        logging.info(health.summarize())
         self.driver.quit()
@@ -0,0 +1,173 @@
+"""
+This module contains the test plan, which is the compiled form of the test data that the TestControllers run.
+
+Each row of the test data is compiled once, when it is validated, into an immutable TestPlanRow. Its test input is already
+parsed into the arguments of its test, and its test type is already resolved to a registered Test class, so running a row is
+a single lookup and call. The rows are read from the data source with csv_utils and compiled lazily as the tests consume them.
+"""
+
+import logging
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import requests
+from colorama import Fore
+
+# The built-in tests register themselves when their modules are imported
+import test_suites.collection_count_test
+import test_suites.element_present_test
+import test_suites.invalid_links_test
+import test_suites.oai_pmh_harvest_test
+import test_suites.permalink_redirect_test
+import test_suites.rest_oai_pmh_xml_validity_test
+import test_suites.site_availibility_test
+import test_suites.site_crawl_test
+import test_suites.viewer_tests
+from test_suites.registry import get_registered_tests, get_test_class
+from utils.csv_utils import extract_rows, format_row
+from utils.sampling_utils import DEFAULT_SAMPLING_CONFIG, SamplingError, sample_object_urls
+from utils.scheduler_utils import parse_interval
+from utils.sheet_cache_utils import DEFAULT_SHEET_CACHE, SheetCache, get_row_hash
+
+logging = logging.getLogger(__name__)
+
+
+class TestPlanRow(NamedTuple):
+    """
+    A compiled row of the test data.
+
+    Rows are immutable tuples with no per-instance dictionary. A row which failed validation has an error and no test class.
+    """
+    row_number: int  # The number of the row in the test data, starting from 1
+    csv_row: dict  # The formatted row, as written to the output CSV
+    url: str  # The URL the test runs on
+    test_type: str  # The type of the test, as given in the test data
+    test_class: Optional[type]  # The registered Test class of the test type, or None if the row is invalid
+    arguments: tuple  # The arguments of the test's run method after the URL
+    interval: Optional[float]  # The number of seconds between runs in daemon mode, or None to use the default
+    error: Optional[str]  # A description of why the row is invalid, or None if it is valid
+
+
+def compile_row(csv_row: dict, row_number: int, error: Optional[str] = None) -> TestPlanRow:
+    """ Return the TestPlanRow for the formatted <csv_row>, which is row <row_number> of the test data and has already been
+    validated with the result <error>. The test input and interval are parsed here, and the row is invalid if they cannot
+    be. """
+    url = csv_row.get("url") or ""
+    test_type = csv_row.get("test_type") or ""
+    test_class = get_test_class(test_type) if error is None else None
+    if error is None and test_class is None:
+        # The row may have skipped validation while its test type was registered, by a plugin that has since been removed
+        error = f"{test_type} is not a valid test type in row {row_number}"
+    if error is None:
+        try:
+            arguments = test_class.parse_input(csv_row.get("test_input") or "")
+            interval = parse_interval(csv_row["interval"]) if csv_row.get("interval") else None
+        except ValueError as e:
+            error = f"{e} in row {row_number}"
+        else:
+            return TestPlanRow(row_number, csv_row, url, test_type, test_class, arguments, interval, None)
+    return TestPlanRow(row_number, csv_row, url, test_type, None, (), None, error)
+
+
+def check_row(row: dict, row_number: int) -> Optional[str]:
+    """ Validate the formatted <row>, which is row <row_number> of the data. Return a description of the first error found,
+    or None if the row is valid."""
+    required_fields = {"url", "test_type"}
+
+    # Check if the row has the required fields
+    for required_field in required_fields:
+        if required_field not in row or not row[required_field]:
+            return f"{required_field} column is missing from row {row_number}"
+
+    # Check if the test type is valid. Every registered test type is valid, including those added by plugins.
+    test_class = get_test_class(row["test_type"])
+    if test_class is None:
+        return f"{row['test_type']} is not a valid test type in row {row_number}"
+
+    # Check if the test type requires an input and if the input is missing if it does require an input
+    if test_class.requires_input and "test_input" not in row:
+        return f"Test Input column is missing from row {row_number}"
+
+    # The sample_size column is optional, but it must be a positive number of objects wherever it is set
+    if row.get("sample_size") and (not row["sample_size"].isdigit() or int(row["sample_size"]) < 1):
+        return f"The sample size must be a positive integer, but got {row['sample_size']} in row {row_number}"
+
+    # The interval column is optional, but it must be a valid interval wherever it is set
+    if row.get("interval"):
+        try:
+            parse_interval(row["interval"])
+        except ValueError as e:
+            return f"{e} in row {row_number}"
+
+    return None
+
+
+def expand_sampled_row(plan_row: TestPlanRow, sampling_config: dict) -> Iterator[TestPlanRow]:
+    """ Yield a TestPlanRow for each object sampled from the URL of <plan_row>, with the settings in <sampling_config>. Each
+    has the row number and test of <plan_row>, with the object's URL. If no objects can be sampled, <plan_row> is yielded as
+    an invalid row instead. """
+    source_url = plan_row.url
+    try:
+        samples = sample_object_urls(source_url, int(plan_row.csv_row["sample_size"]), sampling_config)
+    except (SamplingError, requests.RequestException) as e:
+        error = f"The objects of row {plan_row.row_number} could not be sampled. {e}"
+        print(Fore.RED, "Invalid CSV file. Please see log for more details.", Fore.RESET)
+        logging.error(f"Invalid CSV file. {error}")
+        yield plan_row._replace(test_class=None, arguments=(), error=error)
+        return
+    strata = {}
+    for stratum, _ in samples:
+        strata[stratum or "all"] = strata.get(stratum or "all", 0) + 1
+    logging.info(f"Sampled {len(samples)} objects from {source_url} for row {plan_row.row_number}: "
+                 f"{', '.join(f'{count} from {stratum}' for stratum, count in strata.items())}.")
+    for _, object_url in samples:
+        yield plan_row._replace(csv_row={**plan_row.csv_row, "url": object_url}, url=object_url)
+
+
+def expand_sampled_rows(plan_rows: Iterable[TestPlanRow], sampling_config: dict) -> Iterator[TestPlanRow]:
+    """ Yield every TestPlanRow in <plan_rows>, with each valid row that has a sample size expanded into the rows of its
+    sampled objects, with the settings in <sampling_config>. """
+    for plan_row in plan_rows:
+        if plan_row.error is None and plan_row.csv_row.get("sample_size"):
+            yield from expand_sampled_row(plan_row, sampling_config)
+        else:
+            yield plan_row
+
+
+def stream_data(config: dict, expand_samples: bool = True) -> Iterator[TestPlanRow]:
+    """ Lazily extract, validate and compile the test data from the source specified in <config>, yielding a TestPlanRow for
+    each row. Rows which are invalid have a description of the problem as their error. Rows with a sample size are expanded
+    into the rows of their sampled objects, unless <expand_samples> is unset, in which case they are yielded as they are to be
+    expanded later with expand_sampled_rows.
+
+    Invalid rows are reported in the log as they are found instead of stopping the program. Rows of a Google Sheet which have
+    not changed since they last passed validation are not validated again.
+    """
+    # Only Google Sheets are cached, so only their rows can skip validation
+    sheet_cache = SheetCache(config.get('sheet_cache', DEFAULT_SHEET_CACHE)) if 'google_sheets' in config else None
+    known_valid_row_hashes = sheet_cache.load_valid_row_hashes(config['google_sheets']) if sheet_cache else set()
+    valid_row_hashes = set()
+    registered_test_types = list(get_registered_tests())  # Rows are only known to be valid for these test types
+
+    row_number = 1
+    for row in extract_rows(config):
+        row = format_row(row)
+        row_hash = get_row_hash(row, registered_test_types) if sheet_cache else None
+        error = None if row_hash in known_valid_row_hashes else check_row(row, row_number)
+        plan_row = compile_row(row, row_number, error)
+        if plan_row.error is not None:
+            print(Fore.RED, "Invalid CSV file. Please see log for more details.", Fore.RESET)
+            logging.error(f"Invalid CSV file. {plan_row.error}")
+        else:
+            if sheet_cache:
+                valid_row_hashes.add(row_hash)
+            if row.get("sample_size") and expand_samples:
+                # The row stands for a sample of the objects at its URL, each tested as a row of its own
+                yield from expand_sampled_row(plan_row, config.get('sampling', DEFAULT_SAMPLING_CONFIG))
+                row_number += 1
+                continue
+        yield plan_row
+        row_number += 1
+
+    # The hashes are only replaced once every row has been read, so rows removed from the sheet are forgotten
+    if sheet_cache:
+        sheet_cache.save_valid_row_hashes(config['google_sheets'], valid_row_hashes)
@@ -0,0 +1,222 @@
+"""
+This module contains the TestControllerPool class, which runs tests in parallel across a pool of TestControllers.
+
+Every TestController owns its own headless Chrome driver, so each worker in the pool has a private browser session.
+Rows are read lazily and handed to whichever worker is free, and results are returned in the original row order. Rows that do
+not need a browser can instead be sent to an AsyncHTTPEngine which runs alongside the pool. A driver which crashes, or which
+reaches the limits of its driver health settings, is replaced by a new one without stopping the run.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+from colorama import Fore
+
+from test_suites.test_controller import DriverCrashedError, TestController
+from test_suites.test_plan import TestPlanRow
+from utils.async_http_utils import AsyncHTTPEngine
+from utils.cost_utils import CostEstimator
+from utils.timing_utils import start_recording, stop_recording
+
+logging = logging.getLogger(__name__)
+
+
+class TestControllerPool():
+    """
+    A pool of TestControllers, each owning a separate headless Chrome driver.
+    """
+    def __init__(self, workers: int = 1, config: Optional[dict] = None):
+        """ Launch <workers> TestControllers configured by <config>. The drivers are launched concurrently. """
+        if workers < 1:
+            raise ValueError(f"The number of workers must be at least 1, but got {workers}.")
+        self.workers = workers
+        self.controllers = []
+        self.idle_controllers = queue.Queue()
+        self.first_test_started_at = None  # The time at which the first test began
+        self.crash_count = 0  # The number of times a driver crashed and was replaced
+        self.recycle_count = 0  # The number of times a driver reached its health limits and was replaced
+        self.replayed_row_count = 0  # The number of rows replayed on a new driver after a crash
+        self.lock = threading.Lock()  # Guards the counts, which every worker updates
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(TestController, config) for _ in range(workers)]
+        # Keep every driver that launched so it can be torn down if another one failed
+        self.controllers = [future.result() for future in futures if future.exception() is None]
+        failures = [future.exception() for future in futures if future.exception() is not None]
+        if failures:
+            self.tear_down()
+            raise failures[0]
+        for controller in self.controllers:
+            self.idle_controllers.put(controller)
+
+    def run_test_group(self, plan_rows: list) -> list:
+        """ Runs every TestPlanRow in <plan_rows> on the first free TestController and returns a list of
+        (csv_row, test_result, total_time, timings) tuples in the same order. A row whose driver crashes is replayed once on a
+        new driver, and any other crashing test counts as a failure. The driver is recycled after the rows if it has reached
+        its health limits.
+
+        The rows should share a URL, so that the page is loaded once and every test runs against the same DOM.
+        """
+        controller = self.idle_controllers.get()
+        if self.first_test_started_at is None:
+            self.first_test_started_at = time.time()
+        results = [None] * len(plan_rows)
+        # The rows whose browser profile blocks the fewest requests run first, so the page they load can be shared with the
+        # rows which block more
+        order = sorted(range(len(plan_rows)),
+                       key=lambda index: len(controller.profiles[plan_rows[index].test_type].blocked_urls))
+        try:
+            # The page may have changed since the controller last loaded it
+            controller.clear_navigation_cache()
+            for index in order:
+                plan_row = plan_rows[index]
+                is_replay = False
+                while True:
+                    # Record the current time and the phases of the test
+                    start_time = time.time()
+                    start_recording()
+                    try:
+                        test_result = controller.run_test(plan_row)
+                    except DriverCrashedError as e:
+                        self.replace_driver(controller, f"after it crashed on row {plan_row.row_number + 1}", crashed=True)
+                        if not is_replay:
+                            # The row failed because of the driver rather than the site, so it is run again on the new driver
+                            print(Fore.YELLOW, f"The driver crashed on row {plan_row.row_number + 1}. Replaying the row on a new driver.",
+                                  Fore.RESET)
+                            logging.warning(f"{e} The row will be replayed on a new driver.")
+                            with self.lock:
+                                self.replayed_row_count += 1
+                            stop_recording()
+                            is_replay = True
+                            continue
+                        print(Fore.RED, f"Test crashed on row {plan_row.row_number + 1}. Please see log for more details.", Fore.RESET)
+                        logging.error(f"Test crashed on row {plan_row.row_number + 1} again after it was replayed. {e}")
+                        test_result = False
+                    except Exception as e:
+                        print(Fore.RED, f"Test crashed on row {plan_row.row_number + 1}. Please see log for more details.", Fore.RESET)
+                        logging.error(f"Test crashed on row {plan_row.row_number + 1}. {e}")
+                        test_result = False
+                    break
+                # Calculate the total time taken
+                total_time = time.time() - start_time
+                controller.health.record_row(total_time)
+                results[index] = (plan_row.csv_row, test_result, total_time, stop_recording())
+            # Recycle the driver between groups, so that no page is loaded twice because of it
+            recycle_reason = controller.get_recycle_reason()
+            if recycle_reason is not None:
+                self.replace_driver(controller, recycle_reason)
+        finally:
+            controller.clear_navigation_cache()
+            self.idle_controllers.put(controller)
+        return results
+
+    def replace_driver(self, controller: TestController, reason: str, crashed: bool = False):
+        """ Recycles the driver of <controller> for <reason>, counting it as a crash if <crashed> is set. """
+        with self.lock:
+            if crashed:
+                self.crash_count += 1
+            else:
+                self.recycle_count += 1
+        controller.recycle(reason)
+
+    def submit_chunk(self, chunk: list, executor: ThreadPoolExecutor, http_executor: ThreadPoolExecutor,
+                     http_engine: Optional[AsyncHTTPEngine], cost_estimator: Optional[CostEstimator]) -> Iterator[tuple]:
+        """ Submits every TestPlanRow in <chunk> and returns an iterator over their (csv_row, test_result, total_time, timings)
+        results in the same order.
+
+        The browser rows are grouped by URL and each group runs on a single worker, so a page is only loaded once for all of
+        its tests. If <cost_estimator> is given, the groups expected to take longest are started first, so that a slow group
+        is not left to run alone at the end. Invalid rows are not run, and their test_result is None.
+        """
+        # Rows are identified by their position in the chunk, as the rows sampled from one row of the test data share its
+        # row number
+        valid_positions = [position for position, plan_row in enumerate(chunk) if plan_row.error is None]
+        http_positions = [position for position in valid_positions
+                          if http_engine is not None and http_engine.is_http_test(chunk[position])]
+        http_rows = [chunk[position] for position in http_positions]
+        browser_positions = sorted(set(valid_positions) - set(http_positions))
+
+        # Group the browser rows by URL, keeping the groups in the order their URLs first appear
+        url_groups = {}
+        for position in browser_positions:
+            url_groups.setdefault(chunk[position].url, []).append(position)
+
+        if http_rows and self.first_test_started_at is None:
+            self.first_test_started_at = time.time()
+        http_future = http_executor.submit(http_engine.run_tests, http_rows) if http_rows else None
+        url_groups = list(url_groups.values())
+        if cost_estimator is not None:
+            cost_estimator.load(chunk[position] for position in valid_positions)
+            # Longest expected first: the workers take the groups in submission order, which packs them close to evenly
+            url_groups.sort(key=lambda url_group: sum(cost_estimator.estimate(chunk[position]) for position in url_group),
+                            reverse=True)
+        row_futures = {}  # Maps the position of each browser row to the future of its group and its index within the group
+        for url_group in url_groups:
+            future = executor.submit(self.run_test_group, [chunk[position] for position in url_group])
+            for index, position in enumerate(url_group):
+                row_futures[position] = (future, index)
+
+        def collect_results() -> Iterator[tuple]:
+            http_results = None  # Maps the position of each HTTP-only row to its (test_result, total_time, timings)
+            for position, plan_row in enumerate(chunk):
+                if plan_row.error is not None:
+                    yield plan_row.csv_row, None, 0.0, {}
+                elif position in row_futures:
+                    future, index = row_futures[position]
+                    yield future.result()[index]
+                else:
+                    if http_results is None:
+                        http_results = dict(zip(http_positions, http_future.result()))
+                    yield (plan_row.csv_row, *http_results[position])
+
+        return collect_results()
+
+    def run_tests(self, plan_rows: Iterable[TestPlanRow], http_engine: Optional[AsyncHTTPEngine] = None,
+                  cost_estimator: Optional[CostEstimator] = None, chunk_size: int = 256) -> Iterator[tuple]:
+        """ Runs every TestPlanRow in <plan_rows> across the pool and yields (csv_row, test_result, total_time, timings)
+        tuples in the original row order, where timings maps the phases in TIMING_COLUMNS to their durations. Invalid rows
+        are not run, and their test_result is None.
+
+        The rows are read lazily, <chunk_size> at a time, so tests begin before the whole input has been read and memory stays
+        bounded. If <http_engine> is given, the rows it supports skip the browser and run in its event loop alongside the pool.
+        If <cost_estimator> is given, the slowest work within each chunk is started first.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        http_executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            pending_chunks = deque()  # The results of the chunks which have been submitted but not yet yielded
+            plan_rows = iter(plan_rows)
+            while True:
+                chunk = list(islice(plan_rows, chunk_size))
+                if not chunk:
+                    break
+                pending_chunks.append(self.submit_chunk(chunk, executor, http_executor, http_engine, cost_estimator))
+                # Keep one chunk submitted ahead of the one being yielded, so the workers never wait on the caller
+                if len(pending_chunks) > 1:
+                    yield from pending_chunks.popleft()
+            while pending_chunks:
+                yield from pending_chunks.popleft()
+        finally:
+            # Do not start the remaining rows if the caller stopped early
+            executor.shutdown(wait=True, cancel_futures=True)
+            http_executor.shutdown(wait=True)
+
+    def warm_up(self, url: str):
+        """ Warms up every driver in the pool concurrently by loading <url>. """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(lambda controller: controller.warm_up(url), self.controllers))
+
+    def tear_down(self):
+        """ Tears down every TestController in the pool, even if some of them fail to quit. """
+        for controller in self.controllers:
+            try:
+                controller.tear_down()
+            except Exception as e:
+                logging.error(f"Failed to tear down a driver. {e}")
+        self.controllers = []
@@ -1,72 +1,125 @@
 """
 This module contains tests for the viewers on the collection page.
+
+The OpenSeadragon and Mirador tests support IIIF mode, in which they check the page's IIIF manifest and a sample of its image
+tiles over HTTP instead of waiting for the viewer to render.
 """
 
 from selenium.webdriver.remote.webdriver import WebDriver
+from test_suites.registry import parse_count_input, register_test
 from test_suites.test import Test
 from pages.collection_page import CollectionPage
 
 
+@register_test
 class OpenSeaDragonLoadTest(Test):
     """
     A test to check that the openseadragon viewer loads on the collection page.
     """
+    test_type = "openseadragon_load_test"
+    name = "OpenSeaDragon Load Test"
+    failure_detail = "The viewer did not load. "
+    supports_iiif = True
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str) -> None:
         """ Run the openseadragon load test on the page at <url>."""
-        collection_page = CollectionPage(self.driver, url)
+        collection_page = CollectionPage(self.driver, url, self.timeout, self.poll_interval)
         assert collection_page.is_openseadragon_loads(), "Openseadragon viewer does not load on collection page."
 
+    @classmethod
+    async def run_iiif(cls, engine, session, url: str, timings: dict) -> tuple:
+        """ Run the openseadragon load test on the page at <url> in IIIF mode."""
+        result, message = await engine.is_iiif_viewer_loads(session, url, timings, use_tile_sources=True)
+        return result, message and f"Openseadragon viewer does not load on collection page. {message}"
+
 
+@register_test
 class MiradorLoadTest(Test):
     """
     A test to check that the mirador viewer loads on the collection page.
     """
+    test_type = "mirador_viewer_load_test"
+    name = "Mirador Load Test"
+    cost = 10.0
+    supports_iiif = True
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str) -> None:
         """ Run the mirador load test on the page at <url>."""
-        collection_page = CollectionPage(self.driver, url)
+        collection_page = CollectionPage(self.driver, url, self.timeout, self.poll_interval)
         assert collection_page.is_mirador_loads(), "Mirador viewer does not load on collection page."
 
+    @classmethod
+    async def run_iiif(cls, engine, session, url: str, timings: dict) -> tuple:
+        """ Run the mirador load test on the page at <url> in IIIF mode."""
+        result, message = await engine.is_iiif_viewer_loads(session, url, timings)
+        return result, message and f"Mirador viewer does not load on collection page. {message}"
 
+
+@register_test
 class MiradorPageCountTest(Test):
     """
     A test to check that the mirador viewer has the expected number of thumbnails.
     """
+    test_type = "mirador_page_count_test"
+    name = "Mirador Page Count Test"
+    requires_input = True
+    cost = 10.0
+    parse_input = staticmethod(parse_count_input)
+    supports_iiif = True
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str, expected_number_of_thumbnails: int) -> None:
         """ Run the mirador page count test on the page at <url>."""
-        collection_page = CollectionPage(self.driver, url)
+        collection_page = CollectionPage(self.driver, url, self.timeout, self.poll_interval)
         actual_number_of_thumbnails = collection_page.get_mirador_page_count()
+        assert actual_number_of_thumbnails is not None, "Mirador viewer does not load on collection page."
         assert actual_number_of_thumbnails == expected_number_of_thumbnails, \
             f"Mirador viewer does not have the expected number of thumbnails. " \
             f"Expected {expected_number_of_thumbnails}, got {actual_number_of_thumbnails}."
 
+    @classmethod
+    async def run_iiif(cls, engine, session, url: str, timings: dict, expected_number_of_thumbnails: int) -> tuple:
+        """ Run the mirador page count test on the page at <url> in IIIF mode, counting the canvases of its manifest."""
+        actual_number_of_thumbnails, message = await engine.get_iiif_page_count(session, url, timings)
+        if actual_number_of_thumbnails is None:
+            return False, f"Mirador viewer does not load on collection page. {message}"
+        if actual_number_of_thumbnails != expected_number_of_thumbnails:
+            return False, f"Mirador viewer does not have the expected number of thumbnails. " \
+                          f"Expected {expected_number_of_thumbnails}, got {actual_number_of_thumbnails}."
+        return True, ""
+
 
+@register_test
 class AblePlayerLoadTest(Test):
     """
     A test to check that the ableplayer viewer loads on the collection page.
     """
+    test_type = "ableplayer_load_test"
+    name = "AblePlayer Load Test"
+    failure_detail = "The viewer did not load. "
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str) -> None:
         """ Run the ableplayer load test on the page at <url>."""
-        collection_page = CollectionPage(self.driver, url)
+        collection_page = CollectionPage(self.driver, url, self.timeout, self.poll_interval)
         assert collection_page.is_ableplayer_loads(), "Ableplayer viewer does not load on collection page."
 
 
+@register_test
 class AblePlayerTranscriptLoadTest(Test):
     """
     A test to check that the transcript of the ableplayer viewer loads on the collection page.
     """
+    test_type = "ableplayer_transcript_load_test"
+    name = "AblePlayer Transcript Load Test"
+    cost = 6.0
     driver: WebDriver  # The driver used to load the page
 
     def run(self, url: str) -> None:
         """ Run the ableplayer transcript load test on the page at <url>."""
-        collection_page = CollectionPage(self.driver, url)
+        collection_page = CollectionPage(self.driver, url, self.timeout, self.poll_interval)
         # First check that the ableplayer viewer loads
         assert collection_page.is_ableplayer_loads(), "Ableplayer viewer does not load on collection page."
         # Then check that the transcript loads
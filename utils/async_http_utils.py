@@ -0,0 +1,436 @@
+"""
+async_http_utils.py - An asyncio HTTP engine for tests that do not need a browser.
+
+This module contains the AsyncHTTPEngine class, which runs the tests registered with the HTTP backend, such as the site
+availability, REST OAI-PMH XML validity and invalid links tests, in a single event loop with many requests in flight. These
+tests only need status codes and response bodies, so they never touch a WebDriver.
+
+In IIIF mode the engine also runs the viewer tests which support it, by reading the IIIF manifests and image services the
+viewers would load instead of waiting for the viewers to render.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Optional
+from xml.etree import ElementTree
+
+import aiohttp
+from colorama import Fore
+
+from test_suites.registry import HTTP_BACKEND
+from test_suites.test_plan import TestPlanRow
+from utils.crawl_utils import SiteCrawl, extract_links, get_findings_writer
+from utils.iiif_utils import (find_manifest_urls, find_tile_source_urls, get_canvases, get_image_service_url, get_info_url,
+                              get_tile_url, sample)
+from utils.link_cache_utils import get_link_cache
+from utils.oai_pmh_utils import CHUNK_SIZE, HarvestReport, OAIPMHPageParser, get_page_url
+from utils.rate_limit_utils import get_rate_limiter
+
+logging = logging.getLogger(__name__)
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    """ Return a TraceConfig which records the DNS, connection and time to first byte phases of every request made with a
+    dict as its trace_request_ctx into that dict. """
+    trace_config = aiohttp.TraceConfig()
+
+    def record(context, phase: str, start_time_name: str) -> None:
+        if isinstance(context.trace_request_ctx, dict) and hasattr(context, start_time_name):
+            context.trace_request_ctx[phase] = time.perf_counter() - getattr(context, start_time_name)
+
+    async def on_request_start(session, context, params):
+        context.start_time = time.perf_counter()
+
+    async def on_dns_resolvehost_start(session, context, params):
+        context.dns_start_time = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, context, params):
+        record(context, "dns_time", "dns_start_time")
+
+    async def on_connection_create_start(session, context, params):
+        context.connect_start_time = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        record(context, "connect_time", "connect_start_time")
+
+    async def on_request_end(session, context, params):
+        # The request ends once the response headers have been received
+        record(context, "ttfb", "start_time")
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+class AsyncHTTPEngine():
+    """
+    An engine which runs HTTP-only tests concurrently in a single asyncio event loop.
+
+    NOTE: Links inserted by JavaScript are not seen by the invalid links test, as the page is never rendered.
+    """
+    max_in_flight: int  # The maximum number of requests in flight at once
+    max_connections_per_host: int  # The maximum number of requests in flight to a single host
+    timeout: float  # The number of seconds to wait for a response
+    run_http_backend: bool  # Whether the engine runs the tests registered with the HTTP backend
+    iiif_mode: bool  # Whether the engine runs the viewer tests which support IIIF mode
+
+    def __init__(self, max_in_flight: int = 1000, max_connections_per_host: int = 8, timeout: float = 20,
+                 run_http_backend: bool = True, iiif_mode: bool = False) -> None:
+        """ Create a new AsyncHTTPEngine. """
+        self.max_in_flight = max_in_flight
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.run_http_backend = run_http_backend
+        self.iiif_mode = iiif_mode
+
+        # The engine runs its own event loop in a background thread, which keeps its session open between runs
+        self.loop = None
+        self.loop_thread = None
+        self.loop_lock = threading.Lock()
+        self.session = None
+
+    def is_http_test(self, plan_row: TestPlanRow) -> bool:
+        """ Return whether the test in <plan_row> is run by the engine, which is the case for tests registered with the HTTP
+        backend, and in IIIF mode for the tests which support it. """
+        if plan_row.test_class.backend == HTTP_BACKEND:
+            return self.run_http_backend
+        return self.iiif_mode and plan_row.test_class.supports_iiif
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str, timings: Optional[dict] = None) -> tuple:
+        """ Return a tuple of (status_code, text) for <url>, recording the phases of the request in <timings> if given. """
+        rate_limiter = get_rate_limiter()
+        async with rate_limiter.limit_async(url):
+            async with session.get(url, allow_redirects=True, trace_request_ctx=timings) as response:
+                rate_limiter.record_response(url, response.status, response.headers.get("Retry-After"))
+                return response.status, await response.text(errors="replace")
+
+    async def fetch_json(self, session: aiohttp.ClientSession, url: str) -> tuple:
+        """ Return a tuple of (status_code, document) for the JSON document at <url>, where the document is None if the
+        response is an error or is not JSON. """
+        status_code, response_text = await self.fetch(session, url)
+        if status_code >= 400:
+            return status_code, None
+        try:
+            return status_code, json.loads(response_text)
+        except ValueError:
+            return status_code, None
+
+    async def fetch_tile(self, session: aiohttp.ClientSession, info_url: str) -> Optional[str]:
+        """ Request a tile of the image whose info.json is at <info_url>, and return a description of why it failed, or
+        None if the image server returned an image. """
+        status_code, info = await self.fetch_json(session, info_url)
+        if not isinstance(info, dict):
+            return f"The image information at {info_url} could not be read. The server responded with {status_code}."
+        tile_url = get_tile_url(info, info_url)
+        rate_limiter = get_rate_limiter()
+        async with rate_limiter.limit_async(tile_url):
+            async with session.get(tile_url, allow_redirects=True) as response:
+                rate_limiter.record_response(tile_url, response.status, response.headers.get("Retry-After"))
+                # Tiles are small, and reading one lets its connection be reused for the next request
+                await response.read()
+                if response.status >= 400 or not response.content_type.startswith("image/"):
+                    return f"The tile at {tile_url} did not load. The server responded with {response.status}."
+        return None
+
+    async def get_iiif_canvases(self, session: aiohttp.ClientSession, url: str, timings: dict) -> tuple:
+        """ Return a tuple of (canvases, message) for the first IIIF manifest named on the page at <url>, where canvases is
+        None and the message explains why if the manifest cannot be read. """
+        status_code, response_text = await self.fetch(session, url, timings)
+        if status_code >= 400:
+            return None, f"Page at {url} is not available. The server responded with {status_code}."
+        manifest_urls = find_manifest_urls(url, response_text)
+        if not manifest_urls:
+            return None, f"No IIIF manifest is configured on the page at {url}."
+        status_code, manifest = await self.fetch_json(session, manifest_urls[0])
+        if not isinstance(manifest, dict):
+            return None, f"The IIIF manifest at {manifest_urls[0]} could not be read. The server responded with {status_code}."
+        return get_canvases(manifest), ""
+
+    async def has_loading_tiles(self, session: aiohttp.ClientSession, info_urls: list) -> tuple:
+        """ Return a tuple of (result, message) for whether a tile of each of a sample of the images whose info.json is at
+        one of <info_urls> loads. The sampled tiles are requested concurrently. """
+        if not info_urls:
+            return False, "No IIIF images are configured for the viewer."
+        errors = await asyncio.gather(*(self.fetch_tile(session, info_url) for info_url in sample(info_urls)))
+        errors = [error for error in errors if error is not None]
+        if errors:
+            return False, " ".join(errors)
+        return True, ""
+
+    async def is_iiif_viewer_loads(self, session: aiohttp.ClientSession, url: str, timings: dict,
+                                   use_tile_sources: bool = False) -> tuple:
+        """ Return a tuple of (result, message) for whether the images of the viewer on the page at <url> load from its IIIF
+        manifest. If <use_tile_sources> is set, the info.json documents given to OpenSeadragon are tried before the
+        manifest. The time until the tiles loaded is recorded as the viewer_ready phase. """
+        start_time = time.perf_counter()
+        info_urls = []
+        if use_tile_sources:
+            status_code, response_text = await self.fetch(session, url, timings)
+            if status_code >= 400:
+                return False, f"Page at {url} is not available. The server responded with {status_code}."
+            info_urls = find_tile_source_urls(url, response_text)
+        if not info_urls:
+            canvases, message = await self.get_iiif_canvases(session, url, timings)
+            if canvases is None:
+                return False, message
+            image_service_urls = [get_image_service_url(canvas) for canvas in canvases]
+            info_urls = [get_info_url(image_service_url) for image_service_url in image_service_urls if image_service_url]
+        result, message = await self.has_loading_tiles(session, info_urls)
+        if result:
+            timings["viewer_ready"] = time.perf_counter() - start_time
+        return result, message
+
+    async def get_iiif_page_count(self, session: aiohttp.ClientSession, url: str, timings: dict) -> tuple:
+        """ Return a tuple of (page_count, message) for the number of canvases in the IIIF manifest of the viewer on the page
+        at <url>, where page_count is None and the message explains why if the manifest cannot be read. """
+        start_time = time.perf_counter()
+        canvases, message = await self.get_iiif_canvases(session, url, timings)
+        if canvases is None:
+            return None, message
+        timings["viewer_ready"] = time.perf_counter() - start_time
+        return len(canvases), ""
+
+    async def read_oai_pmh_page(self, session: aiohttp.ClientSession, page_url: str, timings: Optional[dict] = None,
+                                on_resumption_token: Optional[Callable[[str], None]] = None) -> tuple:
+        """ Return a tuple of (status_code, page_parser, latency) for the OAI-PMH list page at <page_url>, which is parsed as
+        it arrives. <on_resumption_token> is called with the page's resumption token as soon as it has been parsed, so the
+        next page can be requested while the rest of this one is read. """
+        page_parser = OAIPMHPageParser()
+        rate_limiter = get_rate_limiter()
+        async with rate_limiter.limit_async(page_url):
+            # The latency of the page starts once its host may be sent the request, so it excludes the rate limits
+            start_time = time.perf_counter()
+            async with session.get(page_url, allow_redirects=True, trace_request_ctx=timings) as response:
+                rate_limiter.record_response(page_url, response.status, response.headers.get("Retry-After"))
+                if response.status < 400:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        page_parser.feed(chunk)
+                        if page_parser.resumption_token is not None and on_resumption_token is not None:
+                            on_resumption_token(page_parser.resumption_token)
+                            on_resumption_token = None
+                    page_parser.close()
+                    if page_parser.resumption_token is not None and on_resumption_token is not None:
+                        on_resumption_token(page_parser.resumption_token)
+                return response.status, page_parser, time.perf_counter() - start_time
+
+    async def harvest_oai_pmh(self, session: aiohttp.ClientSession, url: str, timings: dict,
+                              expected_item_count: Optional[int] = None) -> tuple:
+        """ Return a tuple of (result, message) for whether the OAI-PMH list at <url> can be harvested in full, following
+        its resumption tokens. Each page is requested as soon as the token for it is parsed, so at most one page is
+        prefetched while the previous one is still being read. """
+        report = HarvestReport(url, expected_item_count)
+        prefetched_pages = {}  # Maps the URL of each prefetched page to the task reading it
+        parsed_tokens = {}  # Maps the URL of each prefetched page to its resumption token, once it has been parsed
+        current_page_url = url  # The URL of the page being waited for, which is the only page whose next page is prefetched
+
+        def prefetch(token: str) -> None:
+            page_url = get_page_url(url, token)
+            if token not in report.seen_tokens and page_url not in prefetched_pages:
+                prefetched_pages[page_url] = asyncio.ensure_future(
+                    self.read_oai_pmh_page(session, page_url, on_resumption_token=get_token_handler(page_url)))
+
+        def get_token_handler(page_url: str) -> Callable[[str], None]:
+            """ Return the handler of the resumption token of the page at <page_url>, which prefetches the next page only
+            once the harvest is waiting for this one, and otherwise keeps the token until it is. """
+            def on_resumption_token(token: str) -> None:
+                if page_url == current_page_url:
+                    prefetch(token)
+                else:
+                    parsed_tokens[page_url] = token
+            return on_resumption_token
+
+        page_url = url
+        page = self.read_oai_pmh_page(session, url, timings, get_token_handler(url))
+        try:
+            while page_url is not None:
+                try:
+                    status_code, page_parser, latency = await page
+                except ElementTree.ParseError as e:
+                    report.add_malformed_page(page_url, e)
+                    break
+                if status_code >= 400:
+                    report.add_unavailable_page(page_url, status_code, latency)
+                    break
+                page_url = report.add_page(page_url, page_parser, latency)
+                if page_url is not None:
+                    current_page_url = page_url
+                    page = prefetched_pages.pop(page_url, None)
+                    if page is None:
+                        page = self.read_oai_pmh_page(session, page_url, on_resumption_token=get_token_handler(page_url))
+                    elif page_url in parsed_tokens:
+                        # The page's token was parsed while it was prefetched, so its next page can be requested now
+                        prefetch(parsed_tokens.pop(page_url))
+        finally:
+            for task in prefetched_pages.values():
+                task.cancel()
+        logging.info(report.summarize())
+        failure = report.get_failure()
+        return failure is None, failure or ""
+
+    async def fetch_crawl_page(self, session: aiohttp.ClientSession, url: str, timings: Optional[dict] = None) -> tuple:
+        """ Return a tuple of (status_code, html, final_url) for <url>, where final_url is the URL the page was served from
+        after any redirects. The html is None unless the page is an HTML page that loaded, and the status code is None if
+        the page could not be reached. """
+        rate_limiter = get_rate_limiter()
+        try:
+            async with rate_limiter.limit_async(url):
+                async with session.get(url, allow_redirects=True, trace_request_ctx=timings) as response:
+                    rate_limiter.record_response(url, response.status, response.headers.get("Retry-After"))
+                    if response.status >= 400 or response.content_type != "text/html":
+                        # Only the status code of other files is needed, so their bodies are never downloaded
+                        return response.status, None, str(response.url)
+                    return response.status, await response.text(errors="replace"), str(response.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None, None, url
+
+    async def crawl_site(self, session: aiohttp.ClientSession, url: str, timings: dict, crawl_config: dict) -> tuple:
+        """ Return a tuple of (result, message) for whether a crawl of the site from <url>, with the settings in
+        <crawl_config>, finds no broken links. Each level of the crawl is fetched concurrently, and every broken link is
+        written to the shared CrawlFindingsWriter as soon as it is found. """
+        site_crawl = SiteCrawl(url, crawl_config["max_depth"], crawl_config["max_pages"])
+        findings_writer = get_findings_writer()
+        level = site_crawl.get_first_level()
+        depth = 0
+        while level:
+            pages = await asyncio.gather(*(self.fetch_crawl_page(session, page_url, timings if referrer is None else None)
+                                           for page_url, referrer in level))
+            site_crawl.fetched_pages += len(level)
+            next_level, checks = [], []
+            for (page_url, referrer), (status_code, html, final_url) in zip(level, pages):
+                site_crawl.record_status(referrer, page_url, status_code, findings_writer)
+                if html is not None:
+                    new_pages, new_checks = site_crawl.add_page(page_url, final_url, html, depth)
+                    next_level.extend(new_pages)
+                    checks.extend(new_checks)
+            status_codes = await asyncio.gather(*(self.get_link_status_code(session, link) for link, _ in checks))
+            for (link, referrer), status_code in zip(checks, status_codes):
+                site_crawl.record_status(referrer, link, status_code, findings_writer)
+            level = next_level
+            depth += 1
+        logging.info(site_crawl.summarize())
+        failure = site_crawl.get_failure()
+        return failure is None, failure or ""
+
+    async def get_link_status_code(self, session: aiohttp.ClientSession, link: str) -> Optional[int]:
+        """ Return the status code of <link>, or None if it cannot be reached. Each link is only checked once while its status
+        is in the shared LinkStatusCache. """
+        async def check_status_code(link: str) -> Optional[int]:
+            rate_limiter = get_rate_limiter()
+            try:
+                async with rate_limiter.limit_async(link):
+                    async with session.head(link, allow_redirects=True) as response:
+                        status_code = response.status
+                        rate_limiter.record_response(link, status_code, response.headers.get("Retry-After"))
+                # Some servers refuse or mishandle HEAD requests, so confirm any error with a GET before trusting it
+                if status_code >= 400:
+                    async with rate_limiter.limit_async(link):
+                        async with session.get(link, allow_redirects=True) as response:
+                            status_code = response.status
+                            rate_limiter.record_response(link, status_code, response.headers.get("Retry-After"))
+                return status_code
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return None
+
+        return await get_link_cache().get_status_code_async(link, check_status_code)
+
+    async def is_available(self, session: aiohttp.ClientSession, url: str, timings: dict) -> tuple:
+        """ Return a tuple of (result, message) for whether the page at <url> is available. """
+        status_code, _ = await self.fetch(session, url, timings)
+        if 399 < status_code < 500:
+            return False, f"Page at {url} is not available. The server responded with {status_code}."
+        return True, ""
+
+    async def is_valid_xml(self, session: aiohttp.ClientSession, url: str, timings: dict) -> tuple:
+        """ Return a tuple of (result, message) for whether the XML on the page at <url> is valid. """
+        status_code, response_text = await self.fetch(session, url, timings)
+        if 399 < status_code < 500 or "idDoesNotExist" in response_text or "badVerb" in response_text:
+            return False, "REST OAI PMH XML page is not valid XML."
+        return True, ""
+
+    async def has_no_invalid_links(self, session: aiohttp.ClientSession, url: str, timings: dict) -> tuple:
+        """ Return a tuple of (result, message) for whether the page at <url> has no invalid links. """
+        _, response_text = await self.fetch(session, url, timings)
+        links = list(dict.fromkeys(extract_links(url, response_text)))  # Each link only needs to be checked once
+
+        async def is_valid_link(link: str) -> bool:
+            status_code = await self.get_link_status_code(session, link)
+            return status_code is not None and not (399 < status_code < 500)
+
+        results = await asyncio.gather(*(is_valid_link(link) for link in links))
+        invalid_links = [link for link, is_valid in zip(links, results) if not is_valid]
+        if invalid_links:
+            return False, f"Page with URL {url} has invalid links. Particular links: {invalid_links}"
+        return True, ""
+
+    async def run_test(self, session: aiohttp.ClientSession, plan_row: TestPlanRow) -> tuple:
+        """ Runs the test in <plan_row> and returns a tuple of (test_result, total_time, timings). """
+        test_name = plan_row.test_class.name
+        csv_row_number = plan_row.row_number
+        timings = {}  # Maps the phases of the request for the page to their durations
+        start_time = time.time()
+        try:
+            if plan_row.test_class.backend == HTTP_BACKEND:
+                run = plan_row.test_class.run_http
+            else:
+                run = plan_row.test_class.run_iiif
+            test_result, error_message = await run(self, session, plan_row.url, timings, *plan_row.arguments)
+        except Exception as e:
+            test_result, error_message = False, repr(e)
+        total_time = time.time() - start_time
+
+        if test_result:
+            print(Fore.GREEN, f"{test_name} passed on row {csv_row_number + 1}.", Fore.RESET)
+            logging.info(f"{test_name} passed on row {csv_row_number + 1}.")
+        else:
+            print(Fore.RED, f"{test_name} failed on row {csv_row_number + 1}. Please see log for more details.", Fore.RESET)
+            logging.error(f"{test_name} failed on row {csv_row_number + 1}. {error_message}")
+        return test_result, total_time, timings
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """ Return the engine's session, creating it on first use. The session must be created inside the engine's loop. """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.max_connections_per_host)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[create_trace_config()])
+        return self.session
+
+    async def run_all_tests(self, plan_rows: list) -> list:
+        """ Runs every TestPlanRow in <plan_rows> concurrently and returns a list of (test_result, total_time, timings)
+        tuples in the same order. """
+        session = await self.get_session()
+        return await asyncio.gather(*(self.run_test(session, plan_row) for plan_row in plan_rows))
+
+    def run_tests(self, plan_rows: list) -> list:
+        """ Runs every TestPlanRow in <plan_rows> in the engine's event loop and returns a list of (test_result, total_time,
+        timings) tuples in the same order.
+
+        The event loop and its connections are kept open between calls, so repeated runs reuse warm connections.
+        """
+        if not plan_rows:
+            return []
+        with self.loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+                self.loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(self.run_all_tests(plan_rows), self.loop).result()
+
+    def close(self) -> None:
+        """ Close the engine's connections and stop its event loop. """
+        with self.loop_lock:
+            if self.loop is None:
+                return
+            if self.session is not None:
+                asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+                self.session = None
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join()
+            self.loop.close()
+            self.loop = None
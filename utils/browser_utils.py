@@ -0,0 +1,88 @@
+"""
+browser_utils.py - The Chrome flags and per-test browser profiles used by the TestController.
+
+A browser profile says which requests a test's page may skip and how long the navigation waits for the page. The profiles are
+applied to a running driver before each test, by blocking URL patterns through the Chrome DevTools Protocol, so one driver
+serves every type of test. The driver itself uses the eager page load strategy, which returns once the DOM is ready, and tests
+whose profile needs the whole page wait for the load event themselves.
+
+Every test declares the profile it needs as its browser_profile, and the "browser" key of the configuration file can
+override it per test type, block more URL patterns, and add Chrome flags.
+"""
+
+from typing import NamedTuple
+
+FULL_PROFILE = "full"  # Nothing is blocked, and the navigation waits for the load event
+STANDARD_PROFILE = "standard"  # Analytics and web fonts are blocked, and the navigation waits for the load event
+LEAN_PROFILE = "lean"  # Images and embedded players are blocked too, and the navigation only waits for the DOM
+
+# The flags Chrome is launched with, which turn off everything a headless test run does not use
+CHROME_ARGUMENTS = ["--headless",
+                    "--disable-gpu",
+                    "--disable-extensions",
+                    "--disable-default-apps",
+                    "--disable-sync",
+                    "--disable-background-networking",
+                    "--disable-dev-shm-usage",
+                    "--no-first-run",
+                    "--no-default-browser-check",
+                    "--mute-audio"]
+
+
+def get_extension_patterns(extensions: tuple) -> tuple:
+    """ Return the URL patterns matching files with any of the <extensions>, with or without a query string. """
+    return tuple(pattern for extension in extensions for pattern in (f"*.{extension}", f"*.{extension}?*"))
+
+
+# Analytics, tag managers and social widgets, which none of the tests look at
+TRACKER_PATTERNS = ("*google-analytics.com/*",
+                    "*googletagmanager.com/*",
+                    "*doubleclick.net/*",
+                    "*connect.facebook.net/*",
+                    "*platform.twitter.com/*",
+                    "*static.hotjar.com/*",
+                    "*siteimproveanalytics.com/*")
+FONT_PATTERNS = ("*fonts.googleapis.com/*", "*fonts.gstatic.com/*", "*use.typekit.net/*",
+                 *get_extension_patterns(("woff", "woff2", "ttf", "otf", "eot")))
+# IIIF image tiles are images too, so the viewer tests never use a profile which blocks them
+IMAGE_PATTERNS = get_extension_patterns(("jpg", "jpeg", "png", "gif", "webp", "svg", "ico"))
+EMBED_PATTERNS = ("*youtube.com/embed/*", "*youtube-nocookie.com/embed/*", "*player.vimeo.com/*")
+
+
+class BrowserProfile(NamedTuple):
+    """
+    The browser settings a test runs with.
+    """
+    name: str  # The name of the profile
+    blocked_urls: tuple  # The URL patterns whose requests are blocked, where * matches any characters
+    waits_for_load: bool  # Whether the navigation waits for the load event, rather than only for the DOM
+
+    def allows_page_of(self, other: "BrowserProfile") -> bool:
+        """ Return whether a page loaded with the <other> profile can be checked by a test with this profile, because it
+        blocked nothing this profile needs. """
+        return set(other.blocked_urls) <= set(self.blocked_urls)
+
+
+BROWSER_PROFILES = {
+    FULL_PROFILE: BrowserProfile(FULL_PROFILE, (), True),
+    STANDARD_PROFILE: BrowserProfile(STANDARD_PROFILE, TRACKER_PATTERNS + FONT_PATTERNS, True),
+    LEAN_PROFILE: BrowserProfile(LEAN_PROFILE, TRACKER_PATTERNS + FONT_PATTERNS + IMAGE_PATTERNS + EMBED_PATTERNS, False),
+}
+
+PAGE_LOAD_STRATEGIES = {"eager", "normal"}
+
+# The browser settings used when they are not given in the configuration file
+DEFAULT_BROWSER_CONFIG = {
+    "page_load_strategy": "eager",  # How long the driver waits for a navigation; "normal" always waits for the load event
+    "blocked_urls": [],  # More URL patterns to block for every test, such as a site's own analytics
+    "arguments": [],  # More flags to launch Chrome with
+    "profiles": {},  # Maps test types to the names of the profiles they use instead of their own
+}
+
+
+def get_browser_profile(test_class: type, browser_config: dict) -> BrowserProfile:
+    """ Return the BrowserProfile that tests of <test_class> run with, with the settings in <browser_config>. """
+    profile = BROWSER_PROFILES[browser_config["profiles"].get(test_class.test_type, test_class.browser_profile)]
+    if browser_config["blocked_urls"]:
+        profile = profile._replace(blocked_urls=profile.blocked_urls + tuple(browser_config["blocked_urls"]))
+    return profile
@@ -7,7 +7,20 @@ from ruamel.yaml import YAML
 from colorama import Fore
 import logging
 import os
+import re
 import sys
+from typing import Optional
+
+from utils.browser_utils import BROWSER_PROFILES, DEFAULT_BROWSER_CONFIG, PAGE_LOAD_STRATEGIES
+from utils.crawl_utils import DEFAULT_CRAWL_CONFIG
+from utils.driver_health_utils import DEFAULT_DRIVER_HEALTH_CONFIG
+from utils.http_utils import DEFAULT_HTTP_CONFIG
+from utils.link_cache_utils import DEFAULT_LINK_CACHE_CONFIG
+from utils.rate_limit_utils import DEFAULT_RATE_LIMITS
+from utils.sampling_utils import DEFAULT_SAMPLING_CONFIG
+from utils.scheduler_utils import DEFAULT_INTERVAL, parse_interval
+from utils.sheet_cache_utils import DEFAULT_SHEET_CACHE
+from utils.store_utils import DEFAULT_RESULTS_STORE
 
 logging = logging.getLogger(__name__)
 
@@ -27,6 +40,23 @@ def format_config(config: dict) -> dict:
     return formatted_config
 
 
+def get_rate_limits_error(limits: dict, location: str) -> Optional[str]:
+    """ Return a description of the first error in the rate limits <limits>, found under the key <location> of the
+    configuration file, or None if they are valid. """
+    for key, value in limits.items():
+        if key == "domains" and location == "rate_limits":
+            continue
+        if key == "max_concurrent":
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                return f"The max_concurrent key under {location} must be a positive integer."
+        elif key == "requests_per_second":
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                return f"The requests_per_second key under {location} must be a positive number, or null for no limit."
+        else:
+            return f"The {key} key under {location} is not supported. Supported keys: max_concurrent, requests_per_second"
+    return None
+
+
 def check_config(config: dict) -> None:
     """ Validate the data in the configuration and exit the program if any errors are found."""
     # The data input is mandatory. Data can come from a CSV file, an Excel file, or a Google Sheets URL.
@@ -74,6 +104,282 @@ def check_config(config: dict) -> None:
         # If the key is not present, set the default value to 30 days
         config["delete_stale_files_after"] = 30
 
+    # Next check if the key "skip_browser_for_http_tests" is present and is a boolean
+    if "skip_browser_for_http_tests" in config:
+        if not isinstance(config["skip_browser_for_http_tests"], bool):
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The skip_browser_for_http_tests key must be a boolean.")
+            exit(127)
+    else:
+        # If the key is not present, HTTP-only tests still go through the browser
+        config["skip_browser_for_http_tests"] = False
+
+    # Next check if the key "iiif_mode" is present and is a boolean
+    if "iiif_mode" in config:
+        if not isinstance(config["iiif_mode"], bool):
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The iiif_mode key must be a boolean.")
+            exit(127)
+    else:
+        # If the key is not present, the viewer tests wait for the viewers to render in the browser
+        config["iiif_mode"] = False
+
+    # Next check if the key "results_store" is present and is a path to the results database
+    if "results_store" in config:
+        if not isinstance(config["results_store"], str) or not config["results_store"]:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The results_store key must be the path to a file.")
+            exit(127)
+    else:
+        # If the key is not present, use the default path
+        config["results_store"] = DEFAULT_RESULTS_STORE
+
+    # Next check if the key "sheet_cache" is present and is the path to the directory that Google Sheets are cached in
+    if "sheet_cache" in config:
+        if not isinstance(config["sheet_cache"], str) or not config["sheet_cache"]:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The sheet_cache key must be the path to a directory.")
+            exit(127)
+    else:
+        # If the key is not present, use the default directory
+        config["sheet_cache"] = DEFAULT_SHEET_CACHE
+
+    # Next check if the key "default_interval" is a valid interval, such as 300, "30s", "5m", "1h" or "1d". It is used in
+    # daemon mode for the rows that do not set their own interval.
+    if "default_interval" in config:
+        try:
+            parse_interval(config["default_interval"])
+        except ValueError as e:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(f"The default_interval key is invalid. {e}")
+            exit(127)
+    else:
+        config["default_interval"] = DEFAULT_INTERVAL
+
+    # Next check if the key "plugins" is a list of the names of modules which add their own types of test
+    if "plugins" in config:
+        if not isinstance(config["plugins"], list) or \
+                not all(isinstance(module_name, str) and module_name for module_name in config["plugins"]):
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The plugins key must be a list of module names.")
+            exit(127)
+    else:
+        config["plugins"] = []
+
+    # Next check if the key "warm_up" is one of the supported warm-up targets. The drivers can load about:blank or the URL
+    # of the first row before any test runs, or skip the warm-up entirely.
+    warm_up_targets = {"none", "about:blank", "first_site"}
+    if "warm_up" in config:
+        if config["warm_up"] not in warm_up_targets:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(f"The warm_up key must be one of the following: {', '.join(sorted(warm_up_targets))}")
+            exit(127)
+    else:
+        # If the key is not present, the drivers are not warmed up
+        config["warm_up"] = "none"
+
+    # Next check the wait settings. If timeouts are specified, they must be a dictionary mapping "default" or a test type to
+    # a positive number of seconds. If a poll interval is specified, it must be a positive number of seconds.
+    if "timeouts" in config:
+        if not isinstance(config["timeouts"], dict):
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The timeouts key must be a dictionary.")
+            exit(127)
+        for test_type, timeout in config["timeouts"].items():
+            if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+                print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+                logging.error(f"The timeout for {test_type} must be a positive number of seconds.")
+                exit(127)
+    if "poll_interval" in config:
+        if isinstance(config["poll_interval"], bool) or not isinstance(config["poll_interval"], (int, float)) or config["poll_interval"] <= 0:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The poll_interval key must be a positive number of seconds.")
+            exit(127)
+
+    # Next check the HTTP settings. If they are specified, they must be a dictionary whose values have the same types as
+    # the defaults in DEFAULT_HTTP_CONFIG. Any missing settings are set to their defaults.
+    if "http" in config:
+        if not isinstance(config["http"], dict):
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error("The http key must be a dictionary.")
+            exit(127)
+        for key, value in config["http"].items():
+            if key not in DEFAULT_HTTP_CONFIG:
+                print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+                logging.error(f"The {key} key under the http key is not supported. Supported keys: {', '.join(DEFAULT_HTTP_CONFIG)}")
+                exit(127)
+            # Integers are accepted wherever a float is expected
+            value_type = type(DEFAULT_HTTP_CONFIG[key])
+            if isinstance(value, bool) or not (isinstance(value, value_type) or (value_type is float and isinstance(value, int))):
+                print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+                logging.error(f"The {key} key under the http key must have a value of type {value_type}.")
+                exit(127)
+        config["http"] = {**DEFAULT_HTTP_CONFIG, **config["http"]}
+    else:
+        config["http"] = dict(DEFAULT_HTTP_CONFIG)
+
+    # Next check the per-host rate limits. If they are specified, they must be a dictionary with the settings in
+    # DEFAULT_RATE_LIMITS, and every domain under the domains key may override them. Any missing settings are set to their
+    # defaults.
+    if "rate_limits" in config:
+        rate_limits = config["rate_limits"]
+        error = get_rate_limits_error(rate_limits, "rate_limits") if isinstance(rate_limits, dict) \
+            else "The rate_limits key must be a dictionary."
+        domains = rate_limits.get("domains", {}) if isinstance(rate_limits, dict) else {}
+        if error is None and not isinstance(domains, dict):
+            error = "The domains key under the rate_limits key must be a dictionary."
+        for domain, domain_limits in (domains.items() if error is None else []):
+            error = get_rate_limits_error(domain_limits, f"rate_limits.domains.{domain}") if isinstance(domain_limits, dict) \
+                else f"The {domain} key under rate_limits.domains must be a dictionary."
+            if error is not None:
+                break
+        if error is not None:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(error)
+            exit(127)
+        config["rate_limits"] = {**DEFAULT_RATE_LIMITS, **rate_limits,
+                                 "domains": {str(domain).lower(): domain_limits for domain, domain_limits in domains.items()}}
+    else:
+        config["rate_limits"] = dict(DEFAULT_RATE_LIMITS)
+
+    # Next check the link cache settings. If they are specified, they must be a dictionary with a positive ttl in seconds, a
+    # positive number of max_entries, and the path of the file the cache is saved to between runs, or null to keep it in
+    # memory only. Any missing settings are set to their defaults.
+    if "link_cache" in config:
+        link_cache = config["link_cache"]
+        error = None
+        if not isinstance(link_cache, dict):
+            error = "The link_cache key must be a dictionary."
+        else:
+            for key, value in link_cache.items():
+                if key == "ttl" and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                    error = "The ttl key under the link_cache key must be a positive number of seconds."
+                elif key == "max_entries" and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+                    error = "The max_entries key under the link_cache key must be a positive integer."
+                elif key == "path" and value is not None and (not isinstance(value, str) or not value):
+                    error = "The path key under the link_cache key must be the path to a file, or null."
+                elif key not in DEFAULT_LINK_CACHE_CONFIG:
+                    error = f"The {key} key under the link_cache key is not supported. Supported keys: {', '.join(DEFAULT_LINK_CACHE_CONFIG)}"
+        if error is not None:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(error)
+            exit(127)
+        config["link_cache"] = {**DEFAULT_LINK_CACHE_CONFIG, **link_cache}
+    else:
+        config["link_cache"] = dict(DEFAULT_LINK_CACHE_CONFIG)
+
+
+    # Next check the crawl settings. If they are specified, they must be a dictionary with a max_depth of zero or more links
+    # and a positive max_pages budget. Any missing settings are set to their defaults.
+    if "crawl" in config:
+        crawl = config["crawl"]
+        error = None
+        if not isinstance(crawl, dict):
+            error = "The crawl key must be a dictionary."
+        else:
+            for key, value in crawl.items():
+                if key == "max_depth" and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+                    error = "The max_depth key under the crawl key must be a non-negative integer."
+                elif key == "max_pages" and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+                    error = "The max_pages key under the crawl key must be a positive integer."
+                elif key not in DEFAULT_CRAWL_CONFIG:
+                    error = f"The {key} key under the crawl key is not supported. Supported keys: {', '.join(DEFAULT_CRAWL_CONFIG)}"
+        if error is not None:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(error)
+            exit(127)
+        config["crawl"] = {**DEFAULT_CRAWL_CONFIG, **crawl}
+    else:
+        config["crawl"] = dict(DEFAULT_CRAWL_CONFIG)
+
+    # Next check the sampling settings. If they are specified, they must be a dictionary with the URL alias of the content
+    # model facet, a regular expression matching the paths of object URLs, and a positive number of sitemaps to read from a
+    # sitemap index. Any missing settings are set to their defaults.
+    if "sampling" in config:
+        sampling = config["sampling"]
+        error = None
+        if not isinstance(sampling, dict):
+            error = "The sampling key must be a dictionary."
+        else:
+            for key, value in sampling.items():
+                if key == "model_facet" and (not isinstance(value, str) or not value):
+                    error = "The model_facet key under the sampling key must be the URL alias of a facet."
+                elif key == "object_pattern":
+                    try:
+                        re.compile(value)
+                    except (TypeError, re.error):
+                        error = "The object_pattern key under the sampling key must be a regular expression."
+                elif key == "max_sitemaps" and (isinstance(value, bool) or not isinstance(value, int) or value < 1):
+                    error = "The max_sitemaps key under the sampling key must be a positive integer."
+                elif key not in DEFAULT_SAMPLING_CONFIG:
+                    error = f"The {key} key under the sampling key is not supported. Supported keys: {', '.join(DEFAULT_SAMPLING_CONFIG)}"
+        if error is not None:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(error)
+            exit(127)
+        config["sampling"] = {**DEFAULT_SAMPLING_CONFIG, **sampling}
+    else:
+        config["sampling"] = dict(DEFAULT_SAMPLING_CONFIG)
+
+    # Next check the browser settings. If they are specified, they must be a dictionary with the page load strategy of the
+    # drivers, lists of URL patterns to block and Chrome flags to add, and a dictionary mapping test types to the names of the
+    # browser profiles they use. Any missing settings are set to their defaults.
+    if "browser" in config:
+        browser = config["browser"]
+        error = None
+        if not isinstance(browser, dict):
+            error = "The browser key must be a dictionary."
+        else:
+            for key, value in browser.items():
+                if key == "page_load_strategy" and value not in PAGE_LOAD_STRATEGIES:
+                    error = f"The page_load_strategy key under the browser key must be one of: {', '.join(sorted(PAGE_LOAD_STRATEGIES))}"
+                elif key in ("blocked_urls", "arguments") and (not isinstance(value, list)
+                                                               or not all(isinstance(item, str) and item for item in value)):
+                    error = f"The {key} key under the browser key must be a list of strings."
+                elif key == "profiles" and (not isinstance(value, dict) or not all(profile in BROWSER_PROFILES
+                                                                                   for profile in value.values())):
+                    error = f"The profiles key under the browser key must map test types to one of: {', '.join(BROWSER_PROFILES)}"
+                elif key not in DEFAULT_BROWSER_CONFIG:
+                    error = f"The {key} key under the browser key is not supported. Supported keys: {', '.join(DEFAULT_BROWSER_CONFIG)}"
+        if error is not None:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(error)
+            exit(127)
+        config["browser"] = {**DEFAULT_BROWSER_CONFIG, **browser}
+    else:
+        config["browser"] = dict(DEFAULT_BROWSER_CONFIG)
+
+    # Next check the driver health settings. If they are specified, they must be a dictionary with a positive number of
+    # navigations, a positive number of megabytes and a growth in latency greater than 1 after which a driver is recycled,
+    # any of which may be null for no limit, and a non-negative number of seconds between memory measurements. Any missing
+    # settings are set to their defaults.
+    if "driver_health" in config:
+        driver_health = config["driver_health"]
+        error = None
+        if not isinstance(driver_health, dict):
+            error = "The driver_health key must be a dictionary."
+        else:
+            for key, value in driver_health.items():
+                if key == "max_navigations" and value is not None and (isinstance(value, bool) or not isinstance(value, int)
+                                                                       or value < 1):
+                    error = "The max_navigations key under the driver_health key must be a positive integer, or null."
+                elif key == "max_memory_mb" and value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                                                    or value <= 0):
+                    error = "The max_memory_mb key under the driver_health key must be a positive number of megabytes, or null."
+                elif key == "memory_check_interval" and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+                    error = "The memory_check_interval key under the driver_health key must be a non-negative number of seconds."
+                elif key == "max_latency_growth" and value is not None and (isinstance(value, bool)
+                                                                         or not isinstance(value, (int, float)) or value <= 1):
+                    error = "The max_latency_growth key under the driver_health key must be a number greater than 1, or null."
+                elif key not in DEFAULT_DRIVER_HEALTH_CONFIG:
+                    error = f"The {key} key under the driver_health key is not supported. Supported keys: {', '.join(DEFAULT_DRIVER_HEALTH_CONFIG)}"
+        if error is not None:
+            print(Fore.RED, "There are errors in the configuration file. See log for more details.", Fore.RESET)
+            logging.error(error)
+            exit(127)
+        config["driver_health"] = {**DEFAULT_DRIVER_HEALTH_CONFIG, **driver_health}
+    else:
+        config["driver_health"] = dict(DEFAULT_DRIVER_HEALTH_CONFIG)
 
 def extract_config(filename: str) -> dict:
     """Extracts the configuration from the YAML file at <filename> and returns it as a dictionary. """
@@ -0,0 +1,62 @@
+"""
+cost_utils.py - Estimates of how long each row of the test data will take to run.
+
+This module contains the CostEstimator class, which estimates the cost of each row from the median of its recent total times
+in the results store, falling back on the cost declared by its test when it has no history. The history is only read for the
+rows that are about to run. The TestControllerPool uses the estimates to start the slowest work first, and the estimator keeps
+track of how the estimates compared with the actual times.
+"""
+
+from typing import Iterable, Optional
+
+from test_suites.test_plan import TestPlanRow
+from utils.store_utils import ResultsStore
+
+
+class CostEstimator():
+    """
+    An estimator of the number of seconds each row of the test data takes to run.
+    """
+    results_store: Optional[ResultsStore]  # The store the recent times are read from, if there is one
+    sample_size: int  # The number of recent results of each row whose median is its estimate
+    expected_times: dict  # Maps each (url, test_type) pair read so far which has history to its median total time
+
+    def __init__(self, results_store: Optional[ResultsStore] = None, sample_size: int = 10) -> None:
+        """ Create a new CostEstimator using the median of the last <sample_size> results of each row in <results_store>. """
+        self.results_store = results_store
+        self.sample_size = sample_size
+        self.expected_times = {}
+        self.loaded_tests = set()  # The (url, test_type) pairs whose history has been read from the store
+        self.comparisons = []  # A list of (estimated_time, actual_time, is_from_history) tuples for the rows run so far
+
+    def load(self, plan_rows: Iterable[TestPlanRow]) -> None:
+        """ Read the recent times of each TestPlanRow in <plan_rows> from the results store, unless they have been read
+        already. """
+        if self.results_store is None:
+            return
+        tests = {(plan_row.url, plan_row.test_type) for plan_row in plan_rows} - self.loaded_tests
+        self.expected_times.update(self.results_store.get_expected_times(tests, self.sample_size))
+        self.loaded_tests |= tests
+
+    def estimate(self, plan_row: TestPlanRow) -> float:
+        """ Return the estimated number of seconds that <plan_row> takes to run. """
+        expected_time = self.expected_times.get((plan_row.url, plan_row.test_type))
+        return expected_time if expected_time is not None else plan_row.test_class.cost
+
+    def record_actual(self, plan_row: TestPlanRow, actual_time: float) -> None:
+        """ Record that <plan_row> took <actual_time> seconds to run, to compare against its estimate. """
+        is_from_history = (plan_row.url, plan_row.test_type) in self.expected_times
+        self.comparisons.append((self.estimate(plan_row), actual_time, is_from_history))
+
+    def summarize(self) -> Optional[dict]:
+        """ Return a summary of how the estimates of the rows run so far compared with their actual times, or None if no
+        rows have been run. The summary has the number of rows, the number estimated from history, the total estimated and
+        actual times, and the mean absolute error of the estimates. """
+        if not self.comparisons:
+            return None
+        return {"rows": len(self.comparisons),
+                "rows_from_history": sum(is_from_history for _, _, is_from_history in self.comparisons),
+                "estimated_time": sum(estimated_time for estimated_time, _, _ in self.comparisons),
+                "actual_time": sum(actual_time for _, actual_time, _ in self.comparisons),
+                "mean_absolute_error": sum(abs(estimated_time - actual_time)
+                                           for estimated_time, actual_time, _ in self.comparisons) / len(self.comparisons)}
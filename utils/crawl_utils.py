@@ -0,0 +1,288 @@
+"""
+crawl_utils.py - A bounded breadth-first crawl of a site, for finding broken links on pages nobody listed in the test data.
+
+This module contains the SiteCrawl class, which keeps the state of a crawl that starts from one URL and follows the links on
+the same host up to a configured depth and page budget. The URLs it has seen are kept as 8-byte digests, and the frontier never
+holds more pages than are left in the budget, so its memory is bounded however large the site is. Links which are not crawled
+are checked for their status instead. Broken links are appended to the crawl findings CSV as soon as they are found.
+
+The crawl settings are set from the "crawl" key of the configuration file.
+"""
+
+import csv
+import hashlib
+import logging
+import os
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Optional
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import requests
+
+from utils.http_utils import get_session
+from utils.link_utils import get_link_checker
+
+logging = logging.getLogger(__name__)
+
+# The crawl settings used when they are not given in the configuration file
+DEFAULT_CRAWL_CONFIG = {
+    "max_depth": 2,  # The number of links followed from the starting page
+    "max_pages": 200,  # The number of pages fetched by a single crawl
+}
+
+FINDINGS_HEADER = ["start_url", "page_url", "link", "status_code", "found_at"]  # The columns of the crawl findings CSV
+FAILURE_SAMPLE_SIZE = 10  # The number of broken links listed in the message of a failed crawl
+
+
+class LinkExtractor(HTMLParser):
+    """
+    An HTML parser that collects the absolute http(s) targets of every <a href> on a page.
+    """
+    def __init__(self, base_url: str) -> None:
+        """ Create a new LinkExtractor which resolves relative links against <base_url>. """
+        super().__init__()
+        self.base_url = base_url
+        self.links = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        """ Record the target of every anchor tag. A <base href> changes the URL the links after it are resolved against. """
+        if tag == "base":
+            href = dict(attrs).get("href")
+            if href:
+                self.base_url = urljoin(self.base_url, href.strip())
+            return
+        if tag != "a":
+            return
+        for name, value in attrs:
+            if name == "href" and value:
+                link = urljoin(self.base_url, value.strip())
+                if link.startswith("http"):
+                    self.links.append(link)
+
+
+def extract_links(base_url: str, html: str) -> list:
+    """ Return the absolute http(s) targets of every <a href> in <html>, resolved against <base_url>. """
+    link_extractor = LinkExtractor(base_url)
+    link_extractor.feed(html)
+    link_extractor.close()
+    return link_extractor.links
+
+
+def is_broken_status(status_code: Optional[int]) -> bool:
+    """ Return whether a link which responded with <status_code>, or None if it could not be reached, is broken. """
+    return status_code is None or 399 < status_code < 500
+
+
+class SeenURLs():
+    """
+    A compact set of URLs, which stores an 8-byte BLAKE2b digest of each URL instead of the URL itself.
+
+    Two URLs share a digest with negligible probability, even across millions of URLs.
+    """
+    def __init__(self) -> None:
+        """ Create a new, empty SeenURLs. """
+        self.digests = set()
+
+    def add(self, url: str) -> bool:
+        """ Add <url> and return whether it was not seen before. """
+        digest = hashlib.blake2b(url.encode(), digest_size=8).digest()
+        if digest in self.digests:
+            return False
+        self.digests.add(digest)
+        return True
+
+    def __len__(self) -> int:
+        """ Return the number of URLs seen. """
+        return len(self.digests)
+
+
+class CrawlFindingsWriter():
+    """
+    A thread-safe writer which appends every broken link found by a crawl to a CSV file as soon as it is found.
+
+    The file is only created once there is something to write to it.
+    """
+    path: Optional[str]  # The path of the CSV file, or None to only log the findings
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """ Create a new CrawlFindingsWriter for the CSV file at <path>. """
+        self.path = path
+        self.lock = threading.Lock()
+        self.findings_file = None
+        self.csv_writer = None
+        self.finding_count = 0  # The number of findings written so far
+
+    def write(self, start_url: str, page_url: str, link: str, status_code: Optional[int]) -> None:
+        """ Record that <link> on the page at <page_url>, found by the crawl starting at <start_url>, responded with
+        <status_code>, or None if it could not be reached. """
+        logging.warning(f"Broken link {link} on {page_url} (crawled from {start_url}): {status_code or 'unreachable'}.")
+        with self.lock:
+            self.finding_count += 1
+            if self.path is None:
+                return
+            if self.findings_file is None:
+                is_new_file = not os.path.exists(self.path)
+                self.findings_file = open(self.path, "a", newline="")
+                self.csv_writer = csv.writer(self.findings_file)
+                if is_new_file:
+                    self.csv_writer.writerow(FINDINGS_HEADER)
+            self.csv_writer.writerow([start_url, page_url, link, "" if status_code is None else status_code, time.time()])
+            self.findings_file.flush()
+
+    def close(self) -> None:
+        """ Close the CSV file, if it was opened. """
+        with self.lock:
+            if self.findings_file is not None:
+                self.findings_file.close()
+                self.findings_file = None
+                self.csv_writer = None
+
+
+class SiteCrawl():
+    """
+    The state of a breadth-first crawl of a site. The crawl is driven one level of depth at a time, either synchronously or
+    by the AsyncHTTPEngine.
+    """
+    start_url: str  # The URL the crawl starts from
+    max_depth: int  # The number of links followed from the starting page
+    max_pages: int  # The number of pages the crawl fetches
+
+    def __init__(self, start_url: str, max_depth: int = DEFAULT_CRAWL_CONFIG["max_depth"],
+                 max_pages: int = DEFAULT_CRAWL_CONFIG["max_pages"]) -> None:
+        """ Create a new SiteCrawl starting from <start_url>. """
+        self.start_url = urldefrag(start_url)[0]
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.host = (urlparse(self.start_url).hostname or "").lower()
+        self.seen_urls = SeenURLs()
+        self.seen_urls.add(self.start_url)
+        self.queued_pages = 1  # The number of pages queued to be fetched so far, including the starting page
+        self.fetched_pages = 0  # The number of pages fetched so far
+        self.checked_links = 0  # The number of links checked without being crawled
+        self.broken_links = []  # The first (page_url, link, status_code) findings, for the failure message
+        self.broken_link_count = 0
+
+    def get_first_level(self) -> list:
+        """ Return the first level of the crawl, as a list of (page_url, referrer) pairs. """
+        return [(self.start_url, None)]
+
+    def add_links(self, page_url: str, links: list, depth: int) -> tuple:
+        """ Add the <links> found on the page at <page_url>, which is <depth> links from the starting page. Return a tuple of
+        (pages, checks), which are lists of (url, referrer) pairs. The pages are on the same host, within the depth and page
+        budget, and are crawled in the next level. The checks are the other new links, whose status must be checked. """
+        pages, checks = [], []
+        for link in links:
+            link = urldefrag(link)[0]
+            if not self.seen_urls.add(link):
+                continue
+            if depth < self.max_depth and self.queued_pages < self.max_pages \
+                    and (urlparse(link).hostname or "").lower() == self.host:
+                self.queued_pages += 1
+                pages.append((link, page_url))
+            else:
+                checks.append((link, page_url))
+        self.checked_links += len(checks)
+        return pages, checks
+
+    def add_page(self, page_url: str, final_url: str, html: str, depth: int) -> tuple:
+        """ Add the links on the page at <page_url>, which is <depth> links from the starting page, and return a tuple of
+        (pages, checks) as add_links does. The page was served from <final_url> after any redirects, and its <html> links are
+        resolved against it. A page which redirected off the site adds no links. """
+        if (urlparse(final_url).hostname or "").lower() != self.host:
+            return [], []
+        return self.add_links(page_url, extract_links(final_url, html), depth)
+
+    def record_status(self, referrer: Optional[str], url: str, status_code: Optional[int],
+                      findings_writer: "CrawlFindingsWriter") -> None:
+        """ Record the <status_code> of <url>, found on the page at <referrer>, and write it to <findings_writer> if it is
+        broken. The starting page has no referrer. """
+        if not is_broken_status(status_code):
+            return
+        page_url = referrer or url
+        self.broken_link_count += 1
+        if len(self.broken_links) < FAILURE_SAMPLE_SIZE:
+            self.broken_links.append((page_url, url, status_code))
+        findings_writer.write(self.start_url, page_url, url, status_code)
+
+    def get_failure(self) -> Optional[str]:
+        """ Return a description of why the crawl failed, or None if it found no broken links. """
+        if not self.broken_link_count:
+            return None
+        examples = "; ".join(f"{link} on {page_url} ({status_code or 'unreachable'})"
+                             for page_url, link, status_code in self.broken_links)
+        return f"Found {self.broken_link_count} broken links while crawling from {self.start_url}. Particular links: {examples}"
+
+    def summarize(self) -> str:
+        """ Return a summary of the crawl. """
+        return f"Crawled {self.fetched_pages} pages from {self.start_url} and checked {self.checked_links} more links, " \
+               f"finding {self.broken_link_count} broken links."
+
+
+def is_html_content_type(content_type: str) -> bool:
+    """ Return whether a response with the Content-Type header <content_type> is an HTML page. """
+    return content_type.split(";")[0].strip().lower() == "text/html"
+
+
+def fetch_page(session, url: str) -> tuple:
+    """ Return a tuple of (status_code, html, final_url) for <url> from the requests <session>, where final_url is the URL
+    the page was served from after any redirects. The html is None unless the page is an HTML page that loaded, and the
+    status code is None if the page could not be reached. """
+    try:
+        with session.get(url, stream=True) as response:
+            if response.status_code >= 400 or not is_html_content_type(response.headers.get("Content-Type", "")):
+                # Only the status code of other files is needed, so their bodies are never downloaded
+                return response.status_code, None, response.url
+            return response.status_code, response.text, response.url
+    except requests.RequestException as e:
+        logging.warning(f"Could not reach {url}. {e}")
+        return None, None, url
+
+
+def crawl(start_url: str, crawl_config: dict, findings_writer: CrawlFindingsWriter) -> SiteCrawl:
+    """ Crawl the site from <start_url> with the settings in <crawl_config> over the shared requests session, writing the
+    broken links to <findings_writer>, and return the finished SiteCrawl. The links which are not crawled are checked
+    concurrently by the shared LinkChecker. """
+    site_crawl = SiteCrawl(start_url, crawl_config["max_depth"], crawl_config["max_pages"])
+    level = site_crawl.get_first_level()
+    depth = 0
+    while level:
+        next_level, checks = [], []
+        for page_url, referrer in level:
+            status_code, html, final_url = fetch_page(get_session(), page_url)
+            site_crawl.fetched_pages += 1
+            site_crawl.record_status(referrer, page_url, status_code, findings_writer)
+            if html is not None:
+                new_pages, new_checks = site_crawl.add_page(page_url, final_url, html, depth)
+                next_level.extend(new_pages)
+                checks.extend(new_checks)
+        status_codes = get_link_checker().get_status_codes([link for link, _ in checks])
+        for (link, referrer), status_code in zip(checks, status_codes):
+            site_crawl.record_status(referrer, link, status_code, findings_writer)
+        level = next_level
+        depth += 1
+    return site_crawl
+
+
+_crawl_config = dict(DEFAULT_CRAWL_CONFIG)  # The crawl settings shared by the whole process
+_findings_writer = CrawlFindingsWriter()  # The CrawlFindingsWriter shared by the whole process
+
+
+def configure_crawl(crawl_config: dict, findings_path: Optional[str]) -> None:
+    """ Set the crawl settings shared by the whole process to <crawl_config>, and write the broken links found by every crawl
+    to the CSV file at <findings_path>. Missing settings use their defaults. """
+    global _crawl_config, _findings_writer
+    _crawl_config = {**DEFAULT_CRAWL_CONFIG, **crawl_config}
+    _findings_writer.close()
+    _findings_writer = CrawlFindingsWriter(findings_path)
+
+
+def get_crawl_config() -> dict:
+    """ Return the crawl settings shared by the whole process. """
+    return _crawl_config
+
+
+def get_findings_writer() -> CrawlFindingsWriter:
+    """ Return the CrawlFindingsWriter shared by the whole process. """
+    return _findings_writer
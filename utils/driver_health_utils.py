@@ -0,0 +1,139 @@
+"""
+driver_health_utils.py - Tracking of the health of the Chrome drivers, so a driver can be replaced before it slows down a run.
+
+A Chrome session grows and slows down the longer it lives. This module contains the DriverHealth class, which counts the
+navigations of a driver, measures the memory of its processes and compares the latency of its recent rows with that of its
+first rows, and says when the driver should be recycled. Measuring the memory reads every process in /proc, so it is done at
+most once every memory_check_interval seconds.
+
+The limits are set from the "driver_health" key of the configuration file.
+"""
+
+import os
+import time
+from collections import deque
+from typing import Optional
+
+# The driver health settings used when they are not given in the configuration file
+DEFAULT_DRIVER_HEALTH_CONFIG = {
+    "max_navigations": 250,  # The number of navigations after which a driver is recycled, or null for no limit
+    "max_memory_mb": 1024,  # The megabytes of memory (PSS) a driver's processes may use before it is recycled, or null for no limit
+    "memory_check_interval": 30,  # The least number of seconds between measurements of a driver's memory
+    "max_latency_growth": 3.0,  # How many times slower than its first rows a driver's recent rows may be, or null for no limit
+}
+
+LATENCY_WINDOW = 50  # The number of rows whose mean latency is compared, both at the start of a driver and recently
+
+
+def get_process_memory(process_id: int) -> Optional[int]:
+    """ Return the proportional set size (PSS) in bytes of the process <process_id>, or None if it cannot be read. Each page
+    shared with other processes counts as the page size divided by the number of processes sharing it. """
+    with open(f"/proc/{process_id}/smaps_rollup") as smaps_file:
+        for line in smaps_file:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024  # The size is in kB
+    return None
+
+
+def get_process_tree_memory(pid: int) -> Optional[int]:
+    """ Return the memory in bytes used by the process <pid> and all of its descendants, or None if it cannot be read. Chrome's
+    processes share much of their memory, so it is measured as PSS, which counts each shared page once across the tree
+    rather than once for every process. Only Linux is supported. """
+    try:
+        process_ids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return None
+    children = {}  # Maps each process to its child processes
+    for process_id in process_ids:
+        try:
+            with open(f"/proc/{process_id}/stat") as stat_file:
+                # The command name is in parentheses and may contain spaces, so the fields are read after it
+                parent_id = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # The process has exited since the listing
+        children.setdefault(parent_id, []).append(process_id)
+
+    total_memory = 0
+    pending = [pid]
+    while pending:
+        process_id = pending.pop()
+        try:
+            memory = get_process_memory(process_id)
+        except (OSError, IndexError, ValueError):
+            memory = None  # The process has exited, or the kernel does not report PSS
+        if memory is None:
+            if process_id == pid:
+                return None
+            continue
+        total_memory += memory
+        pending.extend(children.get(process_id, ()))
+    return total_memory
+
+
+class DriverHealth():
+    """
+    The health of a single driver, from the time it was launched.
+    """
+    pid: Optional[int]  # The process ID of the chromedriver service, whose descendants include Chrome, if it is known
+    navigations: int  # The number of pages the driver has navigated to
+    memory: Optional[int]  # The memory of the driver's processes in bytes when it was last measured, if it could be
+    measured_at: Optional[float]  # The time.monotonic() at which the memory was last measured, if it has been
+
+    def __init__(self, pid: Optional[int] = None) -> None:
+        """ Create a new DriverHealth for the driver whose chromedriver service is the process <pid>. """
+        self.pid = pid
+        self.navigations = 0
+        self.memory = None
+        self.measured_at = None
+        self.row_latencies = deque(maxlen=LATENCY_WINDOW)  # The number of seconds each recent row took
+        self.baseline_latency = None  # The mean number of seconds the driver's first LATENCY_WINDOW rows took
+        self.row_count = 0  # The number of rows the driver has run
+
+    def record_row(self, seconds: float) -> None:
+        """ Record that the driver ran a row in <seconds>. """
+        self.row_latencies.append(seconds)
+        self.row_count += 1
+        if self.row_count == LATENCY_WINDOW:
+            self.baseline_latency = self.get_mean_latency()
+
+    def get_mean_latency(self) -> Optional[float]:
+        """ Return the mean number of seconds the driver's recent rows took, or None if it has run none. """
+        return sum(self.row_latencies) / len(self.row_latencies) if self.row_latencies else None
+
+    def get_latency_growth(self) -> Optional[float]:
+        """ Return how many times longer the driver's recent rows took than its first rows, or None until it has run enough
+        rows that the two do not overlap. """
+        if self.row_count < 2 * LATENCY_WINDOW or not self.baseline_latency:
+            return None
+        return self.get_mean_latency() / self.baseline_latency
+
+    def measure(self) -> Optional[int]:
+        """ Measure and return the memory of the driver's processes in bytes, or None if it cannot be read. """
+        self.memory = get_process_tree_memory(self.pid) if self.pid is not None else None
+        self.measured_at = time.monotonic()
+        return self.memory
+
+    def get_recycle_reason(self, health_config: dict) -> Optional[str]:
+        """ Return why the driver should be recycled under the limits in <health_config>, or None if it is healthy. The
+        memory is measured again if it has not been for memory_check_interval seconds. """
+        max_navigations = health_config["max_navigations"]
+        if max_navigations is not None and self.navigations >= max_navigations:
+            return f"after {self.navigations} navigations"
+        max_memory_mb = health_config["max_memory_mb"]
+        if max_memory_mb is not None:
+            if self.measured_at is None or time.monotonic() - self.measured_at >= health_config["memory_check_interval"]:
+                self.measure()
+            if (self.memory or 0) > max_memory_mb * 1024 * 1024:
+                return f"after its memory grew to {self.memory / 1024 / 1024:.0f} MB"
+        max_latency_growth = health_config["max_latency_growth"]
+        latency_growth = self.get_latency_growth()
+        if max_latency_growth is not None and latency_growth is not None and latency_growth > max_latency_growth:
+            return f"after its rows slowed to {latency_growth:.1f} times the latency of its first {LATENCY_WINDOW} rows"
+        return None
+
+    def summarize(self) -> str:
+        """ Return a summary of the driver's health. """
+        mean_latency = self.get_mean_latency()
+        return f"The driver ran {self.row_count} rows in {self.navigations} navigations" \
+               f"{'' if self.memory is None else f', using {self.memory / 1024 / 1024:.0f} MB'}" \
+               f"{'' if mean_latency is None else f', with a mean latency of {mean_latency:.2f}s over its recent rows'}."
@@ -0,0 +1,121 @@
+"""
+http_utils.py - The HTTP session shared by every part of SiteWatch.
+
+This module contains the process-wide requests Session, which keeps per-host pools of keep-alive connections and retries
+failed requests with a backoff. The pool sizes and retry policy are set from the "http" key of the configuration file. Every
+attempt at a request, including each retry, is held to the per-host limits in rate_limit_utils, and the backoff between
+attempts is waited out without holding the host's slot. A Retry-After header is left to the RateLimiter, which pauses the
+host for every request rather than only the one which was answered.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.rate_limit_utils import get_rate_limiter
+
+# The HTTP settings used when they are not given in the configuration file
+DEFAULT_HTTP_CONFIG = {
+    "pool_connections": 32,  # The number of hosts to keep a connection pool for
+    "pool_maxsize": 8,  # The number of keep-alive connections kept per host
+    "max_retries": 3,  # The number of times a failed request is retried
+    "backoff_factor": 0.5,  # Retries wait backoff_factor * 2 ** (retry number - 1) seconds
+    "retry_status_codes": [429, 502, 503, 504],  # The status codes which cause a retry
+    "timeout": 20.0,  # The number of seconds to wait for a response
+}
+
+RETRY_METHODS = {"HEAD", "GET"}  # The methods whose requests are retried, which can be sent again safely
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter which applies a default timeout to every request that does not set one, holds every attempt at a request
+    to the per-host limits of the shared RateLimiter, and retries failed requests with a backoff.
+    """
+    timeout: float  # The number of seconds to wait for a response
+    retries: int  # The number of times a failed request is retried
+    backoff_factor: float  # Retries wait backoff_factor * 2 ** (retry number - 1) seconds
+    retry_status_codes: set  # The status codes which cause a retry
+
+    def __init__(self, timeout: float, *args, retries: int = 0, backoff_factor: float = 0, retry_status_codes=(),
+                 **kwargs) -> None:
+        """ Create a new TimeoutHTTPAdapter with the given default <timeout>, which retries a failed request up to <retries>
+        times, waiting <backoff_factor> * 2 ** (retry number - 1) seconds before each retry. """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_status_codes = set(retry_status_codes)
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        """ Send the request, applying the default timeout if none was given, once its host may be sent another request.
+        A request which fails to connect, times out or is answered with one of the retry status codes is sent again after
+        the backoff, and the last response is returned once the retries run out. """
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        rate_limiter = get_rate_limiter()
+        retries = self.retries if request.method in RETRY_METHODS else 0
+        for retry_number in range(retries + 1):
+            if retry_number > 0:
+                # The backoff is waited out before taking a slot, so the host is free for other requests meanwhile
+                time.sleep(self.backoff_factor * 2 ** (retry_number - 1))
+            with rate_limiter.limit(request.url):
+                sent_at = time.perf_counter()
+                try:
+                    response = super().send(request, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if retry_number == retries:
+                        raise
+                    continue
+            # The time.perf_counter() at which the request that returned was sent, after any wait for the rate limits
+            response.sent_at = sent_at
+            rate_limiter.record_response(request.url, response.status_code, response.headers.get("Retry-After"))
+            if response.status_code not in self.retry_status_codes or retry_number == retries:
+                return response
+            response.close()
+
+
+_http_config = dict(DEFAULT_HTTP_CONFIG)  # The HTTP settings in use
+_session = None  # The Session shared by the whole process
+_session_lock = threading.Lock()
+
+
+def create_session(http_config: dict) -> requests.Session:
+    """ Return a new Session with connection pools and a retry policy set from <http_config>. """
+    adapter = TimeoutHTTPAdapter(http_config["timeout"],
+                                 pool_connections=http_config["pool_connections"],
+                                 pool_maxsize=http_config["pool_maxsize"],
+                                 retries=http_config["max_retries"],
+                                 backoff_factor=http_config["backoff_factor"],
+                                 retry_status_codes=http_config["retry_status_codes"])
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def configure_session(http_config: dict) -> None:
+    """ Replace the shared Session with one using the settings in <http_config>. Missing settings use their defaults. """
+    global _http_config
+    global _session
+    with _session_lock:
+        _http_config = {**DEFAULT_HTTP_CONFIG, **http_config}
+        if _session is not None:
+            _session.close()
+        _session = create_session(_http_config)
+
+
+def get_http_config() -> dict:
+    """ Return the HTTP settings in use. """
+    return _http_config
+
+
+def get_session() -> requests.Session:
+    """ Return the Session shared by the whole process, creating it with the current settings on first use. """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session(_http_config)
+        return _session
@@ -0,0 +1,128 @@
+"""
+iiif_utils.py - A collection of functions for reading IIIF manifests and image services without rendering a viewer.
+
+The OpenSeadragon and Mirador viewers on an Islandora page are configured through the page's drupalSettings, which name the
+IIIF manifest or the info.json of each image they display. This module finds those URLs in the page's HTML, counts the
+canvases of Presentation API 2 and 3 manifests, and builds the URLs of sample tiles from Image API info.json documents, so the
+viewer tests can run as plain HTTP requests in IIIF mode.
+"""
+
+import json
+import re
+from typing import Optional
+from urllib.parse import urljoin
+
+# The script element Drupal serializes drupalSettings into
+DRUPAL_SETTINGS_PATTERN = re.compile(
+    r'<script[^>]*data-drupal-selector="drupal-settings-json"[^>]*>(.*?)</script>', re.DOTALL | re.IGNORECASE)
+
+MANIFEST_KEYS = {"manifest", "manifestId", "manifestUrl", "manifest_url", "iiif_manifest_url"}  # Keys naming a manifest
+TILE_SOURCE_KEYS = {"tileSources", "tileSource"}  # Keys naming the info.json of the images an OpenSeadragon viewer shows
+TILE_SAMPLE_SIZE = 3  # The number of images whose tiles are requested by a test
+
+
+def get_drupal_settings(html: str) -> dict:
+    """ Return the drupalSettings of the page whose HTML is <html>, or an empty dict if it has none. """
+    match = DRUPAL_SETTINGS_PATTERN.search(html)
+    if match is None:
+        return {}
+    try:
+        settings = json.loads(match.group(1))
+    except ValueError:
+        return {}
+    return settings if isinstance(settings, dict) else {}
+
+
+def find_setting_urls(settings, keys: set) -> list:
+    """ Return every URL found under one of <keys> anywhere in <settings>, in the order they appear. A key may hold a URL, a
+    list of URLs, or a dict whose keys are URLs (as Mirador's "manifests" setting does). """
+    urls = []
+    stack = [settings]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            for key, child in value.items():
+                if key in keys:
+                    if isinstance(child, str):
+                        urls.append(child)
+                    elif isinstance(child, list):
+                        urls.extend(item for item in child if isinstance(item, str))
+                    elif isinstance(child, dict):
+                        urls.extend(child)
+                stack.append(child)
+        elif isinstance(value, list):
+            stack.extend(value)
+    return list(dict.fromkeys(url for url in urls if url))
+
+
+def find_manifest_urls(page_url: str, html: str) -> list:
+    """ Return the absolute URLs of the IIIF manifests named in the drupalSettings of the page at <page_url>. """
+    settings = get_drupal_settings(html)
+    manifest_keys = MANIFEST_KEYS | {"manifests"}
+    return [urljoin(page_url, url) for url in find_setting_urls(settings, manifest_keys)]
+
+
+def find_tile_source_urls(page_url: str, html: str) -> list:
+    """ Return the absolute URLs of the info.json documents named as OpenSeadragon tile sources in the drupalSettings of the
+    page at <page_url>. """
+    settings = get_drupal_settings(html)
+    return [urljoin(page_url, url) for url in find_setting_urls(settings, TILE_SOURCE_KEYS)]
+
+
+def get_canvases(manifest: dict) -> list:
+    """ Return the canvases of <manifest>, which follows version 2 or 3 of the IIIF Presentation API. """
+    if "sequences" in manifest:
+        sequences = manifest["sequences"] or [{}]
+        return sequences[0].get("canvases", [])
+    return [item for item in manifest.get("items", []) if item.get("type") == "Canvas"]
+
+
+def get_resource_id(resource: dict) -> Optional[str]:
+    """ Return the id of a version 2 or 3 IIIF <resource>. """
+    return resource.get("id") or resource.get("@id")
+
+
+def get_image_service_url(canvas: dict) -> Optional[str]:
+    """ Return the base URL of the image service of the first image painted on <canvas>, or None if it has none. """
+    if "images" in canvas:
+        # Presentation API 2: canvas.images[].resource.service
+        images = canvas["images"]
+        body = images[0].get("resource", {}) if images else {}
+    else:
+        # Presentation API 3: canvas.items[] (annotation pages) .items[] (annotations) .body.service
+        pages = canvas.get("items") or [{}]
+        annotations = pages[0].get("items") or [{}]
+        body = annotations[0].get("body", {})
+    services = body.get("service")
+    if isinstance(services, list):
+        services = services[0] if services else None
+    if not isinstance(services, dict):
+        return None
+    return get_resource_id(services)
+
+
+def sample(items: list, sample_size: int = TILE_SAMPLE_SIZE) -> list:
+    """ Return up to <sample_size> items of <items>, spread evenly from the first to the last. """
+    if len(items) <= sample_size:
+        return list(items)
+    if sample_size == 1:
+        return [items[0]]
+    return [items[round(index * (len(items) - 1) / (sample_size - 1))] for index in range(sample_size)]
+
+
+def get_info_url(image_service_url: str) -> str:
+    """ Return the URL of the info.json of the image service at <image_service_url>. """
+    if image_service_url.endswith("/info.json"):
+        return image_service_url
+    return f"{image_service_url.rstrip('/')}/info.json"
+
+
+def get_tile_url(info: dict, info_url: str) -> str:
+    """ Return the URL of the top left tile of the image described by the info.json <info>, fetched from <info_url>. """
+    base_url = get_resource_id(info) or info_url[:-len("/info.json")]
+    tiles = info.get("tiles") or [{}]
+    tile_width = tiles[0].get("width") or 256
+    tile_height = tiles[0].get("height") or tile_width
+    region_width = min(tile_width, info.get("width") or tile_width)
+    region_height = min(tile_height, info.get("height") or tile_height)
+    return f"{base_url.rstrip('/')}/0,0,{region_width},{region_height}/{region_width},/0/default.jpg"
@@ -0,0 +1,173 @@
+"""
+link_cache_utils.py - A run-wide cache of the status codes of the links that SiteWatch has checked.
+
+This module contains the LinkStatusCache class, which remembers the status code of every link for a limited time and evicts the
+least recently used links once it is full. Checks of a link that is already being checked wait for that check instead of
+sending their own request, whether they come from a worker thread or from the AsyncHTTPEngine's event loop. The cache can be
+saved to a file, so the next run can reuse the statuses that have not expired.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Optional
+
+logging = logging.getLogger(__name__)
+
+# The link cache settings used when they are not given in the configuration file
+DEFAULT_LINK_CACHE_CONFIG = {
+    "ttl": 3600,  # The number of seconds a link's status is trusted for
+    "max_entries": 100000,  # The number of links remembered before the least recently used are evicted
+    "path": None,  # The file the cache is saved to between runs, or None to keep it in memory only
+}
+
+
+class LinkStatusCache():
+    """
+    A thread-safe cache of link status codes with a time to live and least recently used eviction.
+
+    A status code of None means the link could not be reached.
+    """
+    ttl: float  # The number of seconds a link's status is trusted for
+    max_entries: int  # The number of links remembered before the least recently used are evicted
+    path: Optional[str]  # The file the cache is saved to between runs, if any
+
+    def __init__(self, ttl: float = DEFAULT_LINK_CACHE_CONFIG["ttl"],
+                 max_entries: int = DEFAULT_LINK_CACHE_CONFIG["max_entries"], path: Optional[str] = None) -> None:
+        """ Create a new LinkStatusCache, loading the unexpired entries saved at <path> if it exists. """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()  # Maps each link to its (status_code, checked_at), least recently used first
+        self.in_flight = {}  # Maps each link being checked to the Future of its status code
+        self.lock = threading.Lock()
+        self.hits = 0  # The number of lookups answered from the cache or by a check already in flight
+        self.misses = 0  # The number of lookups which had to check the link
+        if path is not None:
+            self.load()
+
+    def claim(self, link: str) -> tuple:
+        """ Return a tuple of (status_code, future, is_owner) for <link>. If the status is cached, the future is None.
+        Otherwise the future resolves to the status code, and is_owner says whether the caller must check the link and
+        resolve it. """
+        with self.lock:
+            entry = self.entries.get(link)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                self.entries.move_to_end(link)
+                self.hits += 1
+                return entry[0], None, False
+            future = self.in_flight.get(link)
+            if future is not None:
+                self.hits += 1
+                return None, future, False
+            self.misses += 1
+            future = self.in_flight[link] = Future()
+            return None, future, True
+
+    def resolve(self, link: str, future: Future, status_code: Optional[int]) -> None:
+        """ Record <status_code> as the status of <link> and resolve the <future> of its check. """
+        with self.lock:
+            self.entries[link] = (status_code, time.time())
+            self.entries.move_to_end(link)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.in_flight.pop(link, None)
+        future.set_result(status_code)
+
+    def abandon(self, link: str, future: Future, error: BaseException) -> None:
+        """ Fail the <future> of the check of <link> with <error> without caching anything, so the next lookup checks
+        again. """
+        with self.lock:
+            self.in_flight.pop(link, None)
+        future.set_exception(error)
+
+    def get_status_code(self, link: str, check: Callable[[str], Optional[int]]) -> Optional[int]:
+        """ Return the status code of <link>, calling <check> with it only if it is not cached or being checked. """
+        status_code, future, is_owner = self.claim(link)
+        if future is None:
+            return status_code
+        if not is_owner:
+            return future.result()
+        try:
+            status_code = check(link)
+        except BaseException as e:
+            self.abandon(link, future, e)
+            raise
+        self.resolve(link, future, status_code)
+        return status_code
+
+    async def get_status_code_async(self, link: str, check: Callable[[str], Awaitable[Optional[int]]]) -> Optional[int]:
+        """ An asynchronous version of get_status_code, whose <check> is a coroutine function. """
+        status_code, future, is_owner = self.claim(link)
+        if future is None:
+            return status_code
+        if not is_owner:
+            return await asyncio.wrap_future(future)
+        try:
+            status_code = await check(link)
+        except BaseException as e:
+            self.abandon(link, future, e)
+            raise
+        self.resolve(link, future, status_code)
+        return status_code
+
+    def take_statistics(self) -> tuple:
+        """ Return a tuple of the (hits, misses) of the lookups since the statistics were last taken, and reset them. """
+        with self.lock:
+            statistics = self.hits, self.misses
+            self.hits = self.misses = 0
+        return statistics
+
+    def load(self) -> None:
+        """ Load the unexpired entries saved at the cache's path, if it exists. """
+        try:
+            with open(self.path, "r") as cache_file:
+                saved_entries = json.load(cache_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"The link cache at {self.path} could not be read, so it will be rebuilt. {e}")
+            return
+        now = time.time()
+        with self.lock:
+            # The entries are saved least recently used first
+            for link, status_code, checked_at in saved_entries[-self.max_entries:]:
+                if now - checked_at < self.ttl:
+                    self.entries[link] = (status_code, checked_at)
+
+    def save(self) -> None:
+        """ Save the unexpired entries to the cache's path, if it has one. """
+        if self.path is None:
+            return
+        now = time.time()
+        with self.lock:
+            saved_entries = [[link, status_code, checked_at] for link, (status_code, checked_at) in self.entries.items()
+                             if now - checked_at < self.ttl]
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as cache_file:
+            json.dump(saved_entries, cache_file)
+        os.replace(temporary_path, self.path)
+
+
+_link_cache = LinkStatusCache()  # The LinkStatusCache shared by the whole process
+
+
+def configure_link_cache(link_cache_config: dict) -> None:
+    """ Replace the shared LinkStatusCache with one using the settings in <link_cache_config>. Missing settings use their
+    defaults. """
+    global _link_cache
+    link_cache_config = {**DEFAULT_LINK_CACHE_CONFIG, **link_cache_config}
+    _link_cache = LinkStatusCache(link_cache_config["ttl"], link_cache_config["max_entries"], link_cache_config["path"])
+
+
+def get_link_cache() -> LinkStatusCache:
+    """ Return the LinkStatusCache shared by the whole process. """
+    return _link_cache
@@ -0,0 +1,90 @@
+"""
+link_utils.py - A link-checking engine that validates links over plain HTTP.
+
+This module contains the LinkChecker class, which checks many links concurrently without ever touching a WebDriver. Links are
+checked with HEAD requests over the shared HTTP session's keep-alive connections, falling back to GET when the server refuses
+the HEAD request. The session holds the requests to each host to its rate limits, and the statuses are shared across the run
+through the LinkStatusCache.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+
+from utils.http_utils import get_session
+from utils.link_cache_utils import get_link_cache
+
+logging = logging.getLogger(__name__)
+
+
+class LinkChecker():
+    """
+    A thread-safe engine for checking whether links are valid using plain HTTP requests.
+
+    A link is invalid if it responds with a 4xx status code or if it cannot be reached at all.
+    """
+    max_workers: int  # The maximum number of links checked at once
+
+    def __init__(self, max_workers: int = 32) -> None:
+        """ Create a new LinkChecker. The number of requests in flight to any single host is bounded by the rate limits of
+        the shared session, not by <max_workers>. """
+        self.max_workers = max_workers
+
+    def get_status_code(self, link: str) -> Optional[int]:
+        """ Return the status code of <link>, or None if it cannot be reached. Each link is only checked once while its
+        status is in the shared LinkStatusCache. """
+        return get_link_cache().get_status_code(link, self.check_status_code)
+
+    def check_status_code(self, link: str) -> Optional[int]:
+        """ Return the status code of <link> from a new request, or None if it cannot be reached. """
+        try:
+            response = get_session().head(link, allow_redirects=True)
+            # Some servers refuse or mishandle HEAD requests, so confirm any error with a GET before trusting it
+            if response.status_code >= 400:
+                response = get_session().get(link, allow_redirects=True, stream=True)
+                response.close()  # Only the status code is needed, so the body is never downloaded
+            return response.status_code
+        except requests.RequestException as e:
+            logging.warning(f"Could not reach {link}. {e}")
+            return None
+
+    def is_valid_link(self, link: str) -> bool:
+        """ Return whether <link> is valid. """
+        status_code = self.get_status_code(link)
+        return status_code is not None and not (399 < status_code < 500)
+
+    def get_status_codes(self, links: list) -> list:
+        """ Return the status codes of <links> in the same order, with None for the links which cannot be reached.
+
+        This method is multi-threaded.
+        """
+        if not links:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.get_status_code, links))
+
+    def invalid_links(self, links: list) -> list:
+        """ Return the list of invalid links in <links>, in the order they first appear.
+
+        This method is multi-threaded.
+        """
+        unique_links = list(dict.fromkeys(links))  # Each link only needs to be checked once
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(self.is_valid_link, unique_links)
+        return [link for link, is_valid in zip(unique_links, results) if not is_valid]
+
+
+_link_checker = None  # The LinkChecker shared by every page in the process
+_link_checker_lock = threading.Lock()
+
+
+def get_link_checker() -> LinkChecker:
+    """ Return the LinkChecker shared by every page in the process, creating it on first use. """
+    global _link_checker
+    with _link_checker_lock:
+        if _link_checker is None:
+            _link_checker = LinkChecker()
+        return _link_checker
@@ -0,0 +1,181 @@
+"""
+oai_pmh_utils.py - A streaming validator for OAI-PMH list responses.
+
+This module contains the OAIPMHPageParser class, which parses a ListRecords or ListIdentifiers response incrementally as its
+bytes arrive and keeps only the counts it needs, and the HarvestReport class, which follows the resumption tokens of a harvest
+page by page and checks the whole list. Each record is discarded as soon as it has been counted, so memory stays flat however
+many records the repository has.
+"""
+
+import time
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+from xml.etree import ElementTree
+
+OAI_NAMESPACE = "{http://www.openarchives.org/OAI/2.0/}"
+
+# Maps the element of each list verb to the element of one item in its list
+LIST_ITEM_TAGS = {f"{OAI_NAMESPACE}ListRecords": f"{OAI_NAMESPACE}record",
+                  f"{OAI_NAMESPACE}ListIdentifiers": f"{OAI_NAMESPACE}header"}
+ERROR_TAG = f"{OAI_NAMESPACE}error"
+RESUMPTION_TOKEN_TAG = f"{OAI_NAMESPACE}resumptionToken"
+EMPTY_LIST_ERROR_CODE = "noRecordsMatch"  # The error a repository answers with when a list is empty, which is not a failure
+CHUNK_SIZE = 65536  # The number of bytes of a response read at a time
+
+
+class OAIPMHPageParser():
+    """
+    An incremental parser of a single page of an OAI-PMH list response.
+
+    Raises an ElementTree.ParseError from feed or close if the page is not well-formed XML.
+    """
+    list_tag: Optional[str]  # The element of the list verb of the response, or None if it is not a list response
+    item_count: int  # The number of records or headers in the page
+    resumption_token: Optional[str]  # The token of the next page, or None if this is the last page
+    complete_list_size: Optional[int]  # The size of the whole list, if the repository reports it
+    error_codes: list  # The codes of the OAI-PMH errors in the response
+
+    def __init__(self) -> None:
+        """ Create a new OAIPMHPageParser. """
+        self.parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self.open_elements = []  # The elements that have started but not yet ended, outermost first
+        self.list_tag = None
+        self.item_count = 0
+        self.resumption_token = None
+        self.complete_list_size = None
+        self.error_codes = []
+
+    def feed(self, chunk: bytes) -> None:
+        """ Parse the next <chunk> of the response. """
+        self.parser.feed(chunk)
+        self.process_events()
+
+    def close(self) -> None:
+        """ Finish parsing the response. """
+        self.parser.close()
+        self.process_events()
+
+    def process_events(self) -> None:
+        """ Update the counts from the elements parsed so far, and discard every item once it has been counted. """
+        for event, element in self.parser.read_events():
+            if event == "start":
+                if len(self.open_elements) == 1 and element.tag in LIST_ITEM_TAGS:
+                    self.list_tag = element.tag
+                self.open_elements.append(element)
+                continue
+            self.open_elements.pop()
+            if element.tag == ERROR_TAG:
+                self.error_codes.append(element.get("code") or "")
+            elif element.tag == RESUMPTION_TOKEN_TAG:
+                self.resumption_token = (element.text or "").strip() or None
+                complete_list_size = element.get("completeListSize")
+                if complete_list_size is not None and complete_list_size.isdigit():
+                    self.complete_list_size = int(complete_list_size)
+            elif len(self.open_elements) == 2 and self.open_elements[-1].tag == self.list_tag \
+                    and element.tag == LIST_ITEM_TAGS[self.list_tag]:
+                self.item_count += 1
+                self.open_elements[-1].remove(element)
+
+
+def get_page_url(url: str, resumption_token: str) -> str:
+    """ Return the URL of the page of the harvest started at <url> which has <resumption_token>. The protocol only allows
+    the verb alongside a resumption token. """
+    parsed_url = urlparse(url)
+    verb = parse_qs(parsed_url.query).get("verb", ["ListRecords"])[0]
+    return urlunparse(parsed_url._replace(query=urlencode({"verb": verb, "resumptionToken": resumption_token})))
+
+
+class HarvestReport():
+    """
+    The state of a harvest of an OAI-PMH list, which is added to one page at a time.
+    """
+    url: str  # The URL of the first page of the harvest
+    expected_item_count: Optional[int]  # The minimum number of records or headers the list must have, if any
+    item_count: int  # The number of records or headers harvested so far
+    page_latencies: list  # The number of seconds each page took to download and parse, in order
+    errors: list  # Descriptions of the problems found so far
+
+    def __init__(self, url: str, expected_item_count: Optional[int] = None) -> None:
+        """ Create a new HarvestReport for the harvest started at <url>. """
+        self.url = url
+        self.expected_item_count = expected_item_count
+        self.item_count = 0
+        self.page_latencies = []
+        self.errors = []
+        self.complete_list_size = None  # The size of the whole list, as reported by the repository
+        self.seen_tokens = set()  # The resumption tokens followed so far
+
+    def add_page(self, page_url: str, page_parser: OAIPMHPageParser, latency: float) -> Optional[str]:
+        """ Add the page at <page_url>, which was parsed by <page_parser> in <latency> seconds, and return the URL of the
+        next page, or None if the harvest is over. """
+        self.page_latencies.append(latency)
+        self.item_count += page_parser.item_count
+        if page_parser.complete_list_size is not None:
+            self.complete_list_size = page_parser.complete_list_size
+        error_codes = [code for code in page_parser.error_codes if code != EMPTY_LIST_ERROR_CODE]
+        if error_codes:
+            self.errors.append(f"The page at {page_url} has the OAI-PMH errors {error_codes}.")
+            return None
+        if page_parser.list_tag is None and not page_parser.error_codes:
+            self.errors.append(f"The page at {page_url} is not a ListRecords or ListIdentifiers response.")
+            return None
+        token = page_parser.resumption_token
+        if token is None:
+            return None
+        if token in self.seen_tokens:
+            self.errors.append(f"The page at {page_url} repeats the resumption token {token}.")
+            return None
+        self.seen_tokens.add(token)
+        return get_page_url(self.url, token)
+
+    def add_unavailable_page(self, page_url: str, status_code: int, latency: float) -> None:
+        """ Add the page at <page_url>, which the server answered with the error <status_code> in <latency> seconds. """
+        self.page_latencies.append(latency)
+        self.errors.append(f"The page at {page_url} is not available. The server responded with {status_code}.")
+
+    def add_malformed_page(self, page_url: str, error: ElementTree.ParseError) -> None:
+        """ Add the page at <page_url>, which is not well-formed XML because of <error>. """
+        self.errors.append(f"The page at {page_url} is not well-formed XML. {error}")
+
+    def get_failure(self) -> Optional[str]:
+        """ Return a description of why the harvest failed, or None if it passed. """
+        errors = list(self.errors)
+        if not errors and self.complete_list_size is not None and self.item_count != self.complete_list_size:
+            errors.append(f"The repository reported {self.complete_list_size} items, but {self.item_count} were harvested.")
+        if self.expected_item_count is not None and self.item_count < self.expected_item_count:
+            errors.append(f"Expected at least {self.expected_item_count} items, got {self.item_count}.")
+        return " ".join(errors) if errors else None
+
+    def summarize(self) -> str:
+        """ Return a summary of the harvest and the latency of its pages. """
+        latencies = sorted(self.page_latencies)
+        if not latencies:
+            return f"Harvested no pages from {self.url}."
+        # Nearest-rank percentiles, as in the results store
+        p50, p95 = (latencies[max(0, -(-percentile * len(latencies) // 100) - 1)] for percentile in (50, 95))
+        return f"Harvested {self.item_count} items in {len(latencies)} pages from {self.url}. Page latency: " \
+               f"p50 {p50:.2f}s, p95 {p95:.2f}s, max {latencies[-1]:.2f}s."
+
+
+def harvest(session, url: str, expected_item_count: Optional[int] = None) -> HarvestReport:
+    """ Harvest the OAI-PMH list at <url> one page at a time with the requests <session>, and return its HarvestReport. """
+    report = HarvestReport(url, expected_item_count)
+    page_url = url
+    while page_url is not None:
+        page_parser = OAIPMHPageParser()
+        with session.get(page_url, stream=True) as response:
+            # The latency of the page starts once its host may be sent the request, so it excludes the rate limits. Sessions
+            # which do not record when a request was sent fall back to the time it was made.
+            start_time = getattr(response, "sent_at", None) or time.perf_counter() - response.elapsed.total_seconds()
+            if response.status_code >= 400:
+                report.add_unavailable_page(page_url, response.status_code, time.perf_counter() - start_time)
+                break
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    page_parser.feed(chunk)
+                page_parser.close()
+            except ElementTree.ParseError as e:
+                report.add_malformed_page(page_url, e)
+                break
+        page_url = report.add_page(page_url, page_parser, time.perf_counter() - start_time)
+    return report
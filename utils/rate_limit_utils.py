@@ -0,0 +1,172 @@
+"""
+rate_limit_utils.py - Per-host politeness controls shared by every part of SiteWatch that sends requests.
+
+This module contains the RateLimiter class, which bounds the number of requests in flight to each host and spaces out the
+requests that start against it. Hosts which answer 429 or 503 with a Retry-After header are paused for that long across every
+thread and the event loop. The limits are set from the "rate_limits" key of the configuration file, with overrides per domain.
+"""
+
+import asyncio
+import contextlib
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+# The rate limits used when they are not given in the configuration file
+DEFAULT_RATE_LIMITS = {
+    "max_concurrent": 8,  # The number of requests in flight to a single host
+    "requests_per_second": 10.0,  # The number of requests started against a single host per second
+    "domains": {},  # Maps a domain to the limits of it and its subdomains, overriding the two settings above
+}
+
+MAX_RETRY_AFTER = 300  # The longest number of seconds a host is paused for, whatever its Retry-After header asks for
+RETRY_AFTER_STATUS_CODES = {429, 503}  # The status codes whose Retry-After header pauses the host
+ASYNC_POLL_INTERVAL = 0.05  # The number of seconds a coroutine waits between attempts to acquire a busy host
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """ Return the number of seconds a Retry-After header of <value> asks the client to wait, or None if it is missing or
+    invalid. The header is either a number of seconds or an HTTP date. """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class HostLimiter():
+    """
+    The concurrency and rate limit of a single host. It is safe to use from any thread and from the event loop.
+    """
+    max_concurrent: int  # The number of requests in flight to the host
+    requests_per_second: Optional[float]  # The number of requests started against the host per second, or None for no limit
+
+    def __init__(self, max_concurrent: int, requests_per_second: Optional[float]) -> None:
+        """ Create a new HostLimiter. """
+        self.max_concurrent = max_concurrent
+        self.requests_per_second = requests_per_second
+        self.lock = threading.Condition()
+        self.in_flight = 0  # The number of requests in flight
+        self.next_start_time = 0.0  # The earliest time the next request may start
+        self.paused_until = 0.0  # The time until which the host asked not to be sent requests
+
+    def try_acquire(self) -> bool:
+        """ Take a concurrency slot if one is free and return whether one was taken. """
+        with self.lock:
+            if self.in_flight >= self.max_concurrent:
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self) -> None:
+        """ Wait for a concurrency slot and take it. """
+        with self.lock:
+            while self.in_flight >= self.max_concurrent:
+                self.lock.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        """ Give back a concurrency slot. """
+        with self.lock:
+            self.in_flight -= 1
+            self.lock.notify()
+
+    def reserve_start(self) -> float:
+        """ Reserve the next start time for a request and return the number of seconds to wait until it. """
+        with self.lock:
+            now = time.time()
+            start_time = max(now, self.next_start_time, self.paused_until)
+            if self.requests_per_second:
+                self.next_start_time = start_time + 1 / self.requests_per_second
+            return start_time - now
+
+    def pause(self, seconds: float) -> None:
+        """ Hold back every request to the host that has not yet started for <seconds>. """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.time() + seconds)
+
+
+class RateLimiter():
+    """
+    A set of HostLimiters, one for each host that requests are sent to.
+    """
+    rate_limits: dict  # The limits in use, in the format of DEFAULT_RATE_LIMITS
+
+    def __init__(self, rate_limits: Optional[dict] = None) -> None:
+        """ Create a new RateLimiter with the settings in <rate_limits>. Missing settings use their defaults. """
+        self.rate_limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        self.host_limiters = {}  # Maps each host to its HostLimiter
+        self.host_limiters_lock = threading.Lock()
+
+    def get_host_limits(self, host: str) -> dict:
+        """ Return the limits of <host>, from the most specific domain setting which matches it. """
+        limits = {"max_concurrent": self.rate_limits["max_concurrent"],
+                  "requests_per_second": self.rate_limits["requests_per_second"]}
+        matching_domains = [domain for domain in self.rate_limits["domains"]
+                            if host == domain or host.endswith(f".{domain}")]
+        if matching_domains:
+            limits.update(self.rate_limits["domains"][max(matching_domains, key=len)])
+        return limits
+
+    def get_host_limiter(self, url: str) -> HostLimiter:
+        """ Return the HostLimiter of the host of <url>, creating it on first use. """
+        host = (urlparse(url).hostname or "").lower()
+        with self.host_limiters_lock:
+            if host not in self.host_limiters:
+                limits = self.get_host_limits(host)
+                self.host_limiters[host] = HostLimiter(limits["max_concurrent"], limits["requests_per_second"])
+            return self.host_limiters[host]
+
+    @contextlib.contextmanager
+    def limit(self, url: str):
+        """ A context manager which holds a request to <url> until its host has a free slot and may be sent the next
+        request. """
+        host_limiter = self.get_host_limiter(url)
+        host_limiter.acquire()
+        try:
+            time.sleep(host_limiter.reserve_start())
+            yield
+        finally:
+            host_limiter.release()
+
+    @contextlib.asynccontextmanager
+    async def limit_async(self, url: str):
+        """ An asynchronous version of limit, which waits without blocking the event loop. """
+        host_limiter = self.get_host_limiter(url)
+        while not host_limiter.try_acquire():
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+        try:
+            await asyncio.sleep(host_limiter.reserve_start())
+            yield
+        finally:
+            host_limiter.release()
+
+    def record_response(self, url: str, status_code: int, retry_after: Optional[str]) -> None:
+        """ Pause the host of <url> if it responded with <status_code> and a Retry-After header of <retry_after> asking for
+        it. """
+        if status_code in RETRY_AFTER_STATUS_CODES:
+            seconds = parse_retry_after(retry_after)
+            if seconds:
+                self.get_host_limiter(url).pause(seconds)
+
+
+_rate_limiter = RateLimiter()  # The RateLimiter shared by the whole process
+
+
+def configure_rate_limits(rate_limits: dict) -> None:
+    """ Replace the shared RateLimiter with one using the settings in <rate_limits>. """
+    global _rate_limiter
+    _rate_limiter = RateLimiter(rate_limits)
+
+
+def get_rate_limiter() -> RateLimiter:
+    """ Return the RateLimiter shared by the whole process. """
+    return _rate_limiter
@@ -0,0 +1,209 @@
+"""
+sampling_utils.py - Sampling of repository objects for rows of the test data which stand for many objects.
+
+A row with a "sample_size" column does not test its own URL. Its URL is a source of object URLs, either a sitemap.xml or an
+Islandora search or collection page, and the row is expanded into one row for each of a sample of the objects found there.
+
+The objects are divided into strata, by the content model facet of a search page or by the first segment of the path of a
+sitemap URL, and the sample is allocated to the strata in proportion to their sizes, so every kind of object is tested. Each
+stratum is shuffled in a fixed order and the sample is a window into it which moves on every day, so consecutive days test
+different objects and every object is eventually tested. Search pages are only fetched where the sampled results are, using
+the pager summary of each stratum to know how many results it has.
+
+The sampling settings are set from the "sampling" key of the configuration file.
+"""
+
+import datetime
+import logging
+import random
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+from xml.etree import ElementTree
+
+from utils.crawl_utils import extract_links
+from utils.http_utils import get_session
+
+logging = logging.getLogger(__name__)
+
+# The sampling settings used when they are not given in the configuration file
+DEFAULT_SAMPLING_CONFIG = {
+    "model_facet": "model",  # The URL alias of the content model facet on search pages
+    "object_pattern": r"/node/\d+/?$",  # A regular expression matching the path of an object's URL
+    "max_sitemaps": 50,  # The number of sitemaps read from a sitemap index
+}
+
+SITEMAP_NAMESPACE = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+PAGER_SUMMARY_PATTERN = re.compile(r'class="[^"]*pager__summary[^"]*"[^>]*>([^<]*)<')  # The "x - y of z" pager summary
+FACET_PARAMETER_PATTERN = re.compile(r"^f\[\d+\]$")  # The query parameters which hold the active facets of a search page
+
+
+class SamplingError(Exception):
+    """
+    Raised when the objects of a sampled row cannot be found.
+    """
+
+
+def get_rotation_day(today: Optional[datetime.date] = None) -> int:
+    """ Return the number of the day <today> (today by default), which selects the window of each stratum to sample. """
+    return (today or datetime.date.today()).toordinal()
+
+
+def allocate_sample(stratum_sizes: dict, sample_size: int) -> dict:
+    """ Return a dictionary mapping each stratum in <stratum_sizes> to the number of objects to sample from it. The
+    <sample_size> objects are shared in proportion to the sizes of the strata, every stratum gets at least one object while
+    there are enough to go around, and no stratum gets more objects than it has. """
+    stratum_sizes = {stratum: size for stratum, size in stratum_sizes.items() if size > 0}
+    population = sum(stratum_sizes.values())
+    sample_size = min(sample_size, population)
+    if not sample_size:
+        return {}
+    allocation = {stratum: 0 for stratum in stratum_sizes}
+    if sample_size >= len(stratum_sizes):
+        allocation = {stratum: 1 for stratum in stratum_sizes}
+    remaining = sample_size - sum(allocation.values())
+    # Largest remainder: share the rest in proportion to size, then give the leftovers to the largest fractions
+    shares = {stratum: remaining * size / population for stratum, size in stratum_sizes.items()}
+    for stratum, share in shares.items():
+        allocation[stratum] += min(int(share), stratum_sizes[stratum] - allocation[stratum])
+    by_fraction = sorted(stratum_sizes, key=lambda stratum: (shares[stratum] - int(shares[stratum]), stratum_sizes[stratum]),
+                         reverse=True)
+    while sum(allocation.values()) < sample_size:
+        for stratum in by_fraction:
+            if sum(allocation.values()) < sample_size and allocation[stratum] < stratum_sizes[stratum]:
+                allocation[stratum] += 1
+    return allocation
+
+
+def get_rotated_indexes(population: int, count: int, seed: str, day: int) -> list:
+    """ Return <count> distinct indexes out of <population>. The indexes are a window into a shuffle of the population which
+    is fixed by <seed>, and the window moves on by <count> every <day>, so every index is returned once before any repeats. """
+    if not population or not count:
+        return []
+    order = list(range(population))
+    random.Random(seed).shuffle(order)
+    start = (day * count) % population
+    return [order[(start + offset) % population] for offset in range(min(count, population))]
+
+
+def is_sitemap_url(url: str) -> bool:
+    """ Return whether <url> is a sitemap rather than a search or collection page. """
+    return urlparse(url).path.endswith(".xml")
+
+
+def get_sitemap_strata(url: str, sampling_config: dict) -> dict:
+    """ Return a dictionary mapping each stratum of the sitemap at <url> to its object URLs, in the order they are listed.
+    The strata are the first segments of the URLs' paths. Sitemap indexes are followed, up to the configured number of
+    sitemaps. """
+    object_pattern = re.compile(sampling_config["object_pattern"])
+    strata = {}
+    sitemap_urls = [url]
+    read_sitemaps = 0
+    while sitemap_urls and read_sitemaps < sampling_config["max_sitemaps"]:
+        sitemap_url = sitemap_urls.pop(0)
+        read_sitemaps += 1
+        response = get_session().get(sitemap_url)
+        if response.status_code >= 400:
+            raise SamplingError(f"The sitemap at {sitemap_url} is not available. The server responded with {response.status_code}.")
+        try:
+            root = ElementTree.fromstring(response.content)
+        except ElementTree.ParseError as e:
+            raise SamplingError(f"The sitemap at {sitemap_url} is not valid XML. {e}")
+        for location in root.iter(f"{SITEMAP_NAMESPACE}loc"):
+            location_url = (location.text or "").strip()
+            if root.tag == f"{SITEMAP_NAMESPACE}sitemapindex":
+                sitemap_urls.append(location_url)
+            elif object_pattern.search(urlparse(location_url).path):
+                stratum = urlparse(location_url).path.strip("/").split("/")[0]
+                strata.setdefault(stratum, []).append(location_url)
+    return strata
+
+
+def get_result_count(html: str) -> Optional[int]:
+    """ Return the total number of results in the pager summary of a search page, or None if it has none. """
+    match = PAGER_SUMMARY_PATTERN.search(html)
+    if match is None:
+        return None
+    numbers = re.findall(r"\d+", match.group(1))
+    return int(numbers[-1]) if numbers else None  # We only need the last number (z)
+
+
+def get_object_urls(page_url: str, html: str, object_pattern: re.Pattern) -> list:
+    """ Return the distinct object URLs linked from the search page at <page_url>, in the order they appear. """
+    return list(dict.fromkeys(link for link in extract_links(page_url, html)
+                              if urlparse(link).netloc == urlparse(page_url).netloc and object_pattern.search(urlparse(link).path)))
+
+
+def set_query(url: str, **parameters) -> str:
+    """ Return <url> with the query <parameters> set, replacing any values they had. """
+    parsed_url = urlparse(url)
+    query = [(name, value) for name, value in parse_qsl(parsed_url.query, keep_blank_values=True) if name not in parameters]
+    query.extend((name, str(value)) for name, value in parameters.items())
+    return urlunparse(parsed_url._replace(query=urlencode(query)))
+
+
+def get_model_facet_urls(url: str, html: str, model_facet: str) -> dict:
+    """ Return a dictionary mapping each content model offered as a facet on the search page at <url> to the URL of the page
+    filtered by it. """
+    prefix = f"{model_facet}:"
+    facet_urls = {}
+    for link in extract_links(url, html):
+        for name, value in parse_qsl(urlparse(link).query):
+            if FACET_PARAMETER_PATTERN.match(name) and value.startswith(prefix):
+                facet_urls.setdefault(value[len(prefix):], urljoin(url, link))
+    return facet_urls
+
+
+def sample_search_page(url: str, sample_size: int, sampling_config: dict, day: int) -> list:
+    """ Return a list of (stratum, object_url) pairs sampled from the search or collection page at <url>. """
+    object_pattern = re.compile(sampling_config["object_pattern"])
+    session = get_session()
+
+    def fetch(page_url: str) -> str:
+        response = session.get(page_url)
+        if response.status_code >= 400:
+            raise SamplingError(f"The search page at {page_url} is not available. The server responded with {response.status_code}.")
+        return response.text
+
+    first_html = fetch(url)
+    # Each stratum is the search filtered by one content model, or the whole search if the page offers no model facet
+    stratum_urls = get_model_facet_urls(url, first_html, sampling_config["model_facet"]) or {"": url}
+    first_pages = {stratum: first_html if stratum_url == url else fetch(stratum_url)
+                   for stratum, stratum_url in stratum_urls.items()}
+    stratum_sizes, page_sizes = {}, {}
+    for stratum, html in first_pages.items():
+        first_page_objects = get_object_urls(stratum_urls[stratum], html, object_pattern)
+        page_sizes[stratum] = len(first_page_objects)
+        result_count = get_result_count(html)
+        # A stratum whose first page links to no objects cannot be paged through, whatever its summary says
+        stratum_sizes[stratum] = result_count if result_count is not None and first_page_objects else len(first_page_objects)
+
+    samples = []
+    for stratum, count in allocate_sample(stratum_sizes, sample_size).items():
+        pages = {}  # Maps each page number of the stratum to its object URLs
+        for index in get_rotated_indexes(stratum_sizes[stratum], count, f"{url}|{stratum}", day):
+            page_number, position = divmod(index, page_sizes[stratum])
+            if page_number not in pages:
+                html = first_pages[stratum] if page_number == 0 else fetch(set_query(stratum_urls[stratum], page=page_number))
+                pages[page_number] = get_object_urls(stratum_urls[stratum], html, object_pattern)
+            # The last page may be shorter than the summary suggests if objects were removed since the first page was read
+            if position < len(pages[page_number]):
+                samples.append((stratum, pages[page_number][position]))
+    return samples
+
+
+def sample_object_urls(url: str, sample_size: int, sampling_config: dict, day: Optional[int] = None) -> list:
+    """ Return a list of up to <sample_size> (stratum, object_url) pairs sampled from the sitemap or search page at <url>,
+    with the settings in <sampling_config>, rotated for <day> (today by default). Raises a SamplingError if the objects cannot
+    be found. """
+    day = get_rotation_day() if day is None else day
+    if is_sitemap_url(url):
+        strata = get_sitemap_strata(url, sampling_config)
+        allocation = allocate_sample({stratum: len(urls) for stratum, urls in strata.items()}, sample_size)
+        samples = [(stratum, strata[stratum][index]) for stratum, count in allocation.items()
+                   for index in get_rotated_indexes(len(strata[stratum]), count, f"{url}|{stratum}", day)]
+    else:
+        samples = sample_search_page(url, sample_size, sampling_config, day)
+    if not samples:
+        raise SamplingError(f"No objects were found at {url}.")
+    return samples
@@ -0,0 +1,96 @@
+"""
+scheduler_utils.py - A scheduler for running each row of the test data repeatedly at its own interval.
+
+This module contains the Scheduler class, which SiteWatch uses in daemon mode. Each row can set its own interval in an
+"interval" column (for example "60", "30s", "5m", "1h" or "1d"). The first run of the rows sharing an interval is spread evenly
+across that interval, so the checks do not all burst at once.
+"""
+
+import heapq
+import math
+import time
+from typing import Optional
+
+DEFAULT_INTERVAL = "1h"  # The interval of rows which do not set one, when it is not given in the configuration file
+
+# The number of seconds in each unit an interval may be written in
+INTERVAL_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_interval(interval) -> float:
+    """ Return the number of seconds in <interval>, which is either a number of seconds or a string such as "90", "30s",
+    "5m", "1h" or "1d". Raises a ValueError if the interval is invalid or not positive. """
+    if isinstance(interval, bool):
+        raise ValueError(f"Invalid interval: {interval}")
+    if isinstance(interval, (int, float)):
+        seconds = float(interval)
+    else:
+        interval = str(interval).strip().lower()
+        unit = INTERVAL_UNITS.get(interval[-1:]) if interval[-1:].isalpha() else 1
+        number = interval[:-1] if interval[-1:].isalpha() else interval
+        if unit is None:
+            raise ValueError(f"Invalid interval: {interval}. The unit must be one of {', '.join(INTERVAL_UNITS)}.")
+        try:
+            seconds = float(number) * unit
+        except ValueError:
+            raise ValueError(f"Invalid interval: {interval}")
+    if not seconds > 0:
+        raise ValueError(f"Invalid interval: {interval}. The interval must be positive.")
+    return seconds
+
+
+class Scheduler():
+    """
+    A scheduler which decides when each row of the test data is next due to run.
+    """
+    def __init__(self, plan_rows: list, default_interval: float, start_time: float = None) -> None:
+        """ Schedule every TestPlanRow in <plan_rows>. Rows without an interval run every <default_interval> seconds.
+
+        The rows sharing an interval have their first runs spread evenly across that interval, starting at <start_time>
+        (now by default).
+        """
+        start_time = time.time() if start_time is None else start_time
+        # Rows are identified by their position in <plan_rows>, as the rows sampled from one row of the test data share its
+        # row number
+        self.plan_rows = list(plan_rows)
+        self.intervals = [plan_row.interval or default_interval for plan_row in self.plan_rows]  # In seconds, by position
+
+        # Group the rows by interval, and spread each group evenly across its interval
+        rows_by_interval = {}
+        for position, interval in enumerate(self.intervals):
+            rows_by_interval.setdefault(interval, []).append(position)
+        self.queue = []  # A heap of (due_time, position)
+        for interval, positions in rows_by_interval.items():
+            for index, position in enumerate(positions):
+                self.queue.append((start_time + interval * index / len(positions), position))
+        heapq.heapify(self.queue)
+
+    def next_due_time(self) -> Optional[float]:
+        """ Return the time at which the next row is due, or None if no rows are scheduled. """
+        return self.queue[0][0] if self.queue else None
+
+    def pop_due_rows(self, now: float = None) -> list:
+        """ Return a list of the TestPlanRows due at <now> (now by default), in row order, and schedule their next runs.
+
+        A row that fell behind by more than one interval skips the runs it missed rather than running repeatedly to catch up.
+        """
+        now = time.time() if now is None else now
+        due_positions = []
+        while self.queue and self.queue[0][0] <= now:
+            due_time, position = heapq.heappop(self.queue)
+            due_positions.append(position)
+            interval = self.intervals[position]
+            missed_runs = max(0, math.floor((now - due_time) / interval))
+            heapq.heappush(self.queue, (due_time + interval * (missed_runs + 1), position))
+        return [self.plan_rows[position] for position in sorted(due_positions)]
+
+    def wait_for_due_rows(self) -> list:
+        """ Sleep until at least one row is due, then return a list of the TestPlanRows which are due. Raises a ValueError
+        if no rows are scheduled, as none would ever be due. """
+        next_due_time = self.next_due_time()
+        if next_due_time is None:
+            raise ValueError("There are no rows to schedule.")
+        delay = next_due_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return self.pop_due_rows()
@@ -0,0 +1,159 @@
+"""
+sheet_cache_utils.py - A local cache of the Google Sheets that SiteWatch reads its test data from.
+
+This module contains the SheetCache class, which keeps the last CSV export of each sheet on disk, keyed by sheet ID and gid.
+Each fetch is revalidated with a conditional request, so an unchanged sheet is not downloaded again, and the cached copy is
+used when Google cannot be reached. The cache also remembers the content hashes of the rows which passed validation, so
+unchanged rows do not need to be validated again on the next run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Iterable, Optional
+
+import requests
+from colorama import Fore
+
+from utils.http_utils import get_session
+
+logging = logging.getLogger(__name__)
+
+DEFAULT_SHEET_CACHE = "cache/google_sheets"  # The directory of the cache when it is not given in the configuration file
+
+
+class SheetFetchError(Exception):
+    """
+    Raised when a Google Sheet cannot be fetched and there is no cached copy to fall back to.
+    """
+    pass
+
+
+def get_sheet_key(link: str) -> str:
+    """ Return the cache key of the Google Sheet at <link>, made of its sheet ID and gid. """
+    sheet_id = re.search(r"/spreadsheets/d/([^/]+)", link)
+    gid = re.search(r"gid=(\d+)", link)
+    return f"{sheet_id.group(1) if sheet_id else 'unknown'}-{gid.group(1) if gid else '0'}"
+
+
+def get_row_hash(row: dict, test_types: Iterable[str] = ()) -> str:
+    """ Return a hash of the content of the formatted <row>, validated while <test_types> were registered. A row is only valid
+    for the test types it was validated against, so the hash changes with them. """
+    content = {"row": row, "test_types": sorted(test_types)}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SheetCache():
+    """
+    An on-disk cache of the CSV exports of Google Sheets.
+
+    Every sheet has a CSV file holding its last good export, and a JSON file holding the validators used to revalidate it
+    and the hashes of its rows which passed validation.
+    """
+    directory: str  # The directory the cached sheets are kept in
+
+    def __init__(self, directory: str = DEFAULT_SHEET_CACHE) -> None:
+        """ Create a new SheetCache keeping its files in <directory>, creating it if it does not already exist. """
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def get_paths(self, sheet_key: str) -> tuple:
+        """ Return a tuple of the paths of the cached CSV export and metadata of the sheet with <sheet_key>. """
+        return os.path.join(self.directory, f"{sheet_key}.csv"), os.path.join(self.directory, f"{sheet_key}.json")
+
+    def load_metadata(self, sheet_key: str) -> dict:
+        """ Return the cached metadata of the sheet with <sheet_key>, or an empty dictionary if there is none. """
+        _, metadata_path = self.get_paths(sheet_key)
+        try:
+            with open(metadata_path, "r") as metadata_file:
+                return json.load(metadata_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_metadata(self, sheet_key: str, metadata: dict) -> None:
+        """ Replace the cached metadata of the sheet with <sheet_key> with <metadata>. """
+        _, metadata_path = self.get_paths(sheet_key)
+        write_atomically(metadata_path, json.dumps(metadata, indent=2))
+
+    def load_export(self, sheet_key: str) -> Optional[str]:
+        """ Return the cached CSV export of the sheet with <sheet_key>, or None if there is none. """
+        csv_path, _ = self.get_paths(sheet_key)
+        try:
+            with open(csv_path, "r", encoding="utf-8", newline='') as csv_file:
+                return csv_file.read()
+        except OSError:
+            return None
+
+    def fetch(self, link: str, csv_url: str) -> str:
+        """ Return the CSV export of the Google Sheet at <link>, which is downloaded from <csv_url>.
+
+        The cached copy is revalidated with a conditional request and only downloaded again if the sheet has changed. If the
+        sheet cannot be fetched, the cached copy is returned instead. Raises a SheetFetchError if there is no cached copy.
+        Responses which mean the link itself is wrong, such as a 404, are returned to the caller by raising a
+        requests.HTTPError with the response attached.
+        """
+        sheet_key = get_sheet_key(link)
+        metadata = self.load_metadata(sheet_key)
+        cached_export = self.load_export(sheet_key)
+
+        # Only send the validators if there is still a cached copy to fall back on
+        headers = {}
+        if cached_export is not None:
+            if metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+        try:
+            response = get_session().get(url=csv_url, headers=headers, allow_redirects=True)
+        except requests.RequestException as e:
+            return self.fall_back(link, cached_export, repr(e))
+
+        if response.status_code == 304 and cached_export is not None:
+            logging.info(f"The Google Sheet at {link} has not changed since it was cached.")
+            return cached_export
+        if response.status_code == 429 or response.status_code >= 500:
+            return self.fall_back(link, cached_export, f"The server responded with {response.status_code}.")
+        if response.status_code >= 400 or response.content.strip().startswith(b'<!doctype html'):
+            raise requests.HTTPError(response=response)
+
+        # Keep the new export as the last good copy
+        export = response.content.decode('utf-8')
+        csv_path, _ = self.get_paths(sheet_key)
+        write_atomically(csv_path, export)
+        metadata.update(etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+                        fetched_at=time.time())
+        self.save_metadata(sheet_key, metadata)
+        return export
+
+    def fall_back(self, link: str, cached_export: Optional[str], reason: str) -> str:
+        """ Return <cached_export> in place of the Google Sheet at <link>, which could not be fetched because of <reason>.
+        Raises a SheetFetchError if there is no cached copy. """
+        if cached_export is None:
+            raise SheetFetchError(f"The Google Sheet at {link} could not be fetched and has not been cached. {reason}")
+        print(Fore.YELLOW, "The Google Sheet could not be fetched, so the cached copy will be used.", Fore.RESET)
+        logging.warning(f"The Google Sheet at {link} could not be fetched, so the cached copy will be used. {reason}")
+        return cached_export
+
+    def load_valid_row_hashes(self, link: str) -> set:
+        """ Return the hashes of the rows of the Google Sheet at <link> which passed validation on the last full read. """
+        return set(self.load_metadata(get_sheet_key(link)).get("valid_row_hashes", []))
+
+    def save_valid_row_hashes(self, link: str, valid_row_hashes: set) -> None:
+        """ Replace the hashes of the rows of the Google Sheet at <link> which passed validation with <valid_row_hashes>. """
+        sheet_key = get_sheet_key(link)
+        metadata = self.load_metadata(sheet_key)
+        metadata["valid_row_hashes"] = sorted(valid_row_hashes)
+        self.save_metadata(sheet_key, metadata)
+
+
+def write_atomically(path: str, content: str) -> None:
+    """ Replace the file at <path> with <content>, so a crash part way through never leaves a partial file behind. """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8", newline='') as temporary_file:
+        temporary_file.write(content)
+    os.replace(temporary_path, path)
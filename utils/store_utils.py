@@ -0,0 +1,167 @@
+"""
+store_utils.py - A persistent, append-only store of every test result.
+
+This module contains the ResultsStore class, which keeps the result and timings of every row of every run in a local SQLite
+database. The database is indexed by site, URL, test type and time, so latency percentiles and regressions can be queried
+across runs without re-parsing old output CSVs.
+"""
+
+import logging
+import os
+import sqlite3
+import statistics
+import time
+from typing import Iterable, Optional
+from urllib.parse import urlparse
+
+from utils.timing_utils import TIMING_COLUMNS
+
+logging = logging.getLogger(__name__)
+
+DEFAULT_RESULTS_STORE = "results/site_watch.sqlite3"  # The path of the store when it is not given in the configuration file
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    output_csv TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    row_number INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    test_type TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    total_time REAL NOT NULL,
+    {", ".join(f"{phase} REAL" for phase in TIMING_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS results_by_site ON results (site, recorded_at);
+CREATE INDEX IF NOT EXISTS results_by_test ON results (url, test_type, recorded_at);
+CREATE INDEX IF NOT EXISTS results_by_run ON results (run_id);
+"""
+
+
+class ResultsStore():
+    """
+    An append-only SQLite store of the results and timings of every row of every run.
+
+    Results are only ever inserted, never updated or deleted.
+    """
+    path: str  # The path of the SQLite database
+
+    def __init__(self, path: str = DEFAULT_RESULTS_STORE) -> None:
+        """ Open the store at <path>, creating it if it does not already exist. """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def start_run(self, output_csv: Optional[str] = None) -> int:
+        """ Record the start of a new run writing to <output_csv> and return its run ID. """
+        cursor = self.connection.execute("INSERT INTO runs (started_at, output_csv) VALUES (?, ?)", (time.time(), output_csv))
+        self.connection.commit()
+        return cursor.lastrowid
+
+    def add_result(self, run_id: int, row_number: int, csv_row: dict, passed: bool, total_time: float, timings: dict) -> None:
+        """ Record the result of the test in <csv_row>, which was row <row_number> of the run <run_id>.
+
+        NOTE: The result is not visible to other connections until commit() or finish_run() is called.
+        """
+        url = csv_row["url"]
+        self.connection.execute(
+            f"INSERT INTO results (run_id, row_number, recorded_at, site, url, test_type, passed, total_time, "
+            f"{', '.join(TIMING_COLUMNS)}) VALUES ({', '.join('?' * (8 + len(TIMING_COLUMNS)))})",
+            (run_id, row_number, time.time(), urlparse(url).netloc, url, csv_row["test_type"], int(passed), total_time,
+             *(timings.get(phase) for phase in TIMING_COLUMNS))
+        )
+
+    def commit(self) -> None:
+        """ Make the results added so far visible to other connections. """
+        self.connection.commit()
+
+    def finish_run(self, run_id: int) -> None:
+        """ Record that the run <run_id> has finished. """
+        self.connection.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+        self.connection.commit()
+
+    def get_sites(self, since: float, until: Optional[float] = None) -> list:
+        """ Return the sites with results recorded between the timestamps <since> and <until> (now by default). """
+        until = time.time() if until is None else until
+        rows = self.connection.execute("SELECT DISTINCT site FROM results WHERE recorded_at BETWEEN ? AND ? ORDER BY site",
+                                       (since, until))
+        return [site for site, in rows]
+
+    def get_latency_percentiles(self, site: str, since: float, until: Optional[float] = None, percentiles: tuple = (50, 95),
+                                column: str = "total_time") -> dict:
+        """ Return a dictionary mapping each of <percentiles> to the latency of <site> at that percentile, over the results
+        recorded between the timestamps <since> and <until> (now by default). The latency is read from <column>, which must
+        be total_time or one of TIMING_COLUMNS. Percentiles are None if there are no results. """
+        if column != "total_time" and column not in TIMING_COLUMNS:
+            raise ValueError(f"Invalid latency column: {column}")
+        until = time.time() if until is None else until
+        condition = f"site = ? AND recorded_at BETWEEN ? AND ? AND {column} IS NOT NULL"
+        count, = self.connection.execute(f"SELECT COUNT(*) FROM results WHERE {condition}", (site, since, until)).fetchone()
+
+        latencies = {}
+        for percentile in percentiles:
+            if count == 0:
+                latencies[percentile] = None
+                continue
+            # Nearest-rank percentile: only the one row at that rank is read
+            rank = max(0, min(count - 1, -(-percentile * count // 100) - 1))
+            latency, = self.connection.execute(
+                f"SELECT {column} FROM results WHERE {condition} ORDER BY {column} LIMIT 1 OFFSET ?",
+                (site, since, until, rank)
+            ).fetchone()
+            latencies[percentile] = latency
+        return latencies
+
+    def get_expected_times(self, tests: Iterable[tuple], sample_size: int = 10) -> dict:
+        """ Return a dictionary mapping each of the (url, test_type) pairs in <tests> which has results to the median total
+        time of its last <sample_size> results, passing or failing. Only the results of the given pairs are read. """
+        expected_times = {}
+        for url, test_type in tests:
+            total_times = [total_time for total_time, in self.connection.execute(
+                "SELECT total_time FROM results WHERE url = ? AND test_type = ? ORDER BY recorded_at DESC LIMIT ?",
+                (url, test_type, sample_size)
+            )]
+            if total_times:
+                expected_times[(url, test_type)] = statistics.median(total_times)
+        return expected_times
+
+    def find_regressions(self, run_id: int, baseline_size: int = 10, threshold: float = 2.0) -> list:
+        """ Return a list of the results in the run <run_id> which regressed against a rolling baseline.
+
+        The baseline of each URL and test type is the median total time of its last <baseline_size> passing results before
+        the run. A result regressed if it failed after the baseline passed, or if it took more than <threshold> times the
+        baseline. Each regression is a dictionary with the row_number, url, test_type, passed, total_time and baseline.
+        """
+        results = self.connection.execute(
+            "SELECT row_number, url, test_type, passed, total_time, recorded_at FROM results WHERE run_id = ? ORDER BY row_number",
+            (run_id,)
+        ).fetchall()
+
+        regressions = []
+        for row_number, url, test_type, passed, total_time, recorded_at in results:
+            baseline_times = [baseline_time for baseline_time, in self.connection.execute(
+                "SELECT total_time FROM results WHERE url = ? AND test_type = ? AND recorded_at < ? AND run_id != ? "
+                "AND passed = 1 ORDER BY recorded_at DESC LIMIT ?",
+                (url, test_type, recorded_at, run_id, baseline_size)
+            )]
+            if not baseline_times:
+                continue  # There is nothing to compare against yet
+            baseline = statistics.median(baseline_times)
+            if not passed or total_time > threshold * baseline:
+                regressions.append({"row_number": row_number, "url": url, "test_type": test_type, "passed": bool(passed),
+                                    "total_time": total_time, "baseline": baseline})
+        return regressions
+
+    def close(self) -> None:
+        """ Close the store. """
+        self.connection.close()
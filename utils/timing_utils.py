@@ -0,0 +1,70 @@
+"""
+timing_utils.py - A collection of functions for recording how long each phase of a test takes.
+
+Timings are recorded per thread, so a worker can start recording before it runs a row and collect the phases recorded by the
+pages and the HTTP layer once the row has finished. All timings are in seconds.
+"""
+
+import threading
+from typing import Optional
+
+# The phases that are recorded, in the order they appear as columns in the output CSV
+TIMING_COLUMNS = ["dns_time",  # Resolving the host name
+                  "connect_time",  # Opening the connection, including the TLS handshake
+                  "tls_time",  # The TLS handshake alone
+                  "ttfb",  # From the start of the request to the first byte of the response
+                  "dom_content_loaded",  # From the start of the navigation until DOMContentLoaded has been handled
+                  "load_time",  # From the start of the navigation until the load event has been handled
+                  "viewer_ready"]  # From the start of the navigation until the viewer appears
+
+# JavaScript returning the Navigation Timing phases of the loaded page in milliseconds, or null if they are not available
+NAVIGATION_TIMING_SCRIPT = """
+const entry = performance.getEntriesByType("navigation")[0];
+if (!entry) {
+    return null;
+}
+return {
+    dns_time: entry.domainLookupEnd - entry.domainLookupStart,
+    connect_time: entry.connectEnd - entry.connectStart,
+    tls_time: entry.secureConnectionStart > 0 ? entry.connectEnd - entry.secureConnectionStart : 0,
+    ttfb: entry.responseStart - entry.startTime,
+    dom_content_loaded: entry.domContentLoadedEventEnd > 0 ? entry.domContentLoadedEventEnd - entry.startTime : null,
+    load_time: entry.loadEventEnd > 0 ? entry.loadEventEnd - entry.startTime : null
+};
+"""
+
+_recording = threading.local()  # Holds the timings of the row that the current thread is running
+
+
+def start_recording() -> None:
+    """ Start recording the timings of a new row on the current thread. """
+    _recording.timings = {}
+
+
+def stop_recording() -> dict:
+    """ Stop recording on the current thread and return the recorded timings. """
+    timings = getattr(_recording, "timings", None) or {}
+    _recording.timings = None
+    return timings
+
+
+def record_timing(phase: str, seconds: Optional[float]) -> None:
+    """ Record that <phase> took <seconds> in the row the current thread is running. Nothing is recorded if the current
+    thread is not recording or if <seconds> is None. """
+    timings = getattr(_recording, "timings", None)
+    if timings is not None and seconds is not None:
+        timings[phase] = seconds
+
+
+def record_navigation_timings(navigation_timings: Optional[dict]) -> None:
+    """ Record the phases in <navigation_timings>, as returned by NAVIGATION_TIMING_SCRIPT, in the current thread's row. """
+    if not navigation_timings:
+        return
+    for phase, milliseconds in navigation_timings.items():
+        if milliseconds is not None:
+            record_timing(phase, milliseconds / 1000)
+
+
+def format_timings(timings: dict) -> list:
+    """ Return the values of <timings> as strings in the order of TIMING_COLUMNS. Missing phases are left blank. """
+    return [str(timings[phase]) if phase in timings else "" for phase in TIMING_COLUMNS]